@@ -0,0 +1,167 @@
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from .metrics import Counter, Histogram
+
+# ============================================
+# ADMISSION CONTROL CONFIGURATION
+# ============================================
+HASH_ADMISSION_ENABLED = os.getenv("HASH_ADMISSION_ENABLED", "1") == "1"
+# Hashing jobs allowed to wait for a worker; past that, requests get 503
+HASH_QUEUE_MAX = int(os.getenv("HASH_QUEUE_MAX", "32"))
+# Longest a waiting hashing job is held back while token-only requests run (0 = no priority)
+HASH_PRIORITY_MAX_DEFER_MS = float(os.getenv("HASH_PRIORITY_MAX_DEFER_MS", "50"))
+
+ADMISSION_WAIT_SECONDS = Histogram(
+    "hash_admission_wait_seconds", "Time a hashing job waited to be admitted to the hash pool"
+)
+ADMISSION_REJECTED = Counter("hash_admission_rejected_total", "Hashing jobs turned away because the queue was full")
+
+
+class Overloaded(Exception):
+    """The hashing queue is full; retry_after is a suggested wait in seconds"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Hashing queue is full, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Bounded queue in front of the hash pool
+
+    At most `slots` hashing jobs run at once and at most `max_queue` wait
+    for one; further jobs fail fast with Overloaded instead of piling up
+    behind minutes of bcrypt work. A job that finds a free slot and no
+    queue starts at once. Once jobs are queued, though, a freed slot is
+    held back for up to `max_defer` seconds while token-only requests are
+    in progress, so those cheap requests get the CPU first without
+    starving logins.
+    Background jobs (bulk import) only get a slot no request job is
+    waiting for; they are bounded by their caller, not by `max_queue`.
+
+    Runs on the event loop only, so no locking is needed.
+    """
+
+    def __init__(self, slots: int, max_queue: int = HASH_QUEUE_MAX,
+                 max_defer: float = HASH_PRIORITY_MAX_DEFER_MS / 1000, enabled: bool = HASH_ADMISSION_ENABLED):
+        self.slots = max(1, slots)
+        self.max_queue = max_queue
+        self.max_defer = max_defer
+        self.enabled = enabled
+        self._running = 0
+        self._waiters = deque()   # (future, enqueued_at), oldest first
+        self._background = deque()   # same, for background jobs
+        self._priority = 0
+        self._recheck = None
+        self._job_seconds = 0.0   # moving average of how long a job holds its slot
+        self.admitted = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self, background: bool = False):
+        """Hold one hashing slot for the duration of the block"""
+        if not self.enabled:
+            yield
+            return
+        await self._acquire(background)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            held = time.perf_counter() - started
+            self._job_seconds = 0.8 * self._job_seconds + 0.2 * held if self._job_seconds else held
+            self._running -= 1
+            self._dispatch()
+
+    @contextmanager
+    def priority(self):
+        """Mark a token-only request as in progress for the duration of the block"""
+        self._priority += 1
+        try:
+            yield
+        finally:
+            self._priority -= 1
+            if not self._priority:
+                self._dispatch()
+
+    def retry_after(self) -> float:
+        """Rough time until the current backlog drains"""
+        backlog = len(self._waiters) + len(self._background) + self._running
+        return max(1.0, backlog * self._job_seconds / self.slots)
+
+    async def _acquire(self, background: bool = False):
+        enqueued = time.perf_counter()
+        queue = self._background if background else self._waiters
+        # Token requests only hold hashing back when it is competing for slots
+        if self._running < self.slots and not self._waiters and not queue:
+            self._running += 1
+            self.admitted += 1
+            ADMISSION_WAIT_SECONDS.observe(0.0)
+            return
+        if not background and len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            ADMISSION_REJECTED.inc()
+            raise Overloaded(self.retry_after())
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, enqueued)
+        queue.append(entry)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the caller went away: pass the slot on
+                self._running -= 1
+                self._dispatch()
+            elif entry in queue:
+                queue.remove(entry)
+            raise
+        self.admitted += 1
+        ADMISSION_WAIT_SECONDS.observe(time.perf_counter() - enqueued)
+
+    def _dispatch(self):
+        """Hand free slots to waiting jobs, oldest first, background jobs last"""
+        while self._running < self.slots:
+            queue = self._waiters or self._background
+            if not queue:
+                return
+            future, enqueued = queue[0]
+            if future.cancelled():
+                queue.popleft()
+                continue
+            if self._priority:
+                defer_left = enqueued + self.max_defer - time.perf_counter()
+                if defer_left > 0:
+                    self._schedule_recheck(defer_left)
+                    return
+            queue.popleft()
+            self._running += 1
+            future.set_result(None)
+
+    def _schedule_recheck(self, delay: float):
+        if self._recheck is None:
+            self._recheck = asyncio.get_running_loop().call_later(delay, self._on_recheck)
+
+    def _on_recheck(self):
+        self._recheck = None
+        self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "slots": self.slots,
+            "running": self._running,
+            "queued": len(self._waiters),
+            "queued_background": len(self._background),
+            "max_queue": self.max_queue,
+            "priority_in_flight": self._priority,
+            "priority_max_defer_ms": self.max_defer * 1000,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_job_seconds": round(self._job_seconds, 4),
+        }
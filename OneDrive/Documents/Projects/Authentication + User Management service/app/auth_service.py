@@ -1,9 +1,33 @@
-import bcrypt
+import asyncio
 import jwt
-from datetime import datetime, timedelta
+import secrets
+import time
+from datetime import timedelta
 import logging
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from .database import User
+from .counters import increment_users
+from .database import User, user_session
+from .metrics import AUTH_RESULTS, DB_COMMIT_SECONDS, DB_QUERY_SECONDS, JWT_SECONDS, PASSWORD_REHASHES
+from .revocation import revocation_index
+from .token_cache import token_cache
+from .user_cache import user_cache
+from .breached import is_breached
+from .keys import HS256_CUTOFF, JWT_ACCEPT_HS256, get_keyring
+from .jwt_codec import JWT_FAST_HS256, HS256Codec
+from .signup_writer import SIGNUP_GROUP_COMMIT, signup_writer_for
+from .single_flight import LOGIN_SINGLE_FLIGHT, login_flight_key, login_flights
+from .hashing import (
+    hash_password,
+    check_password,
+    hash_password_async,
+    check_password_async,
+    dummy_hash_async,
+    needs_rehash,
+)
+from .username_filter import username_index
 
 logger = logging.getLogger(__name__)
 
@@ -13,19 +37,17 @@ logger = logging.getLogger(__name__)
 SECRET_KEY = "my-super-secure-jwt-secret-key-12345!"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-print("=" * 50)
-print("AUTH SERVICE INITIALIZED")
-print(f"SECRET_KEY: {SECRET_KEY[:15]}...")
-print(f"ALGORITHM: {ALGORITHM}")
-print(f"EXPIRY: {ACCESS_TOKEN_EXPIRE_MINUTES} minutes")
-print("=" * 50)
+REFRESH_TOKEN_EXPIRE_DAYS = 7
 
 # Exception classes
 class AuthError(Exception): pass
 class UserAlreadyExists(AuthError): pass
 class WeakPassword(AuthError): pass
+class BreachedPassword(WeakPassword): pass
 class InvalidCredentials(AuthError): pass
+class InvalidToken(InvalidCredentials): pass
+class TokenExpired(InvalidCredentials): pass
+class TokenRevoked(InvalidCredentials): pass
 
 # Password validation
 LEGAL_SYMBOLS = "!.@#$%^&*()_[]"
@@ -50,28 +72,41 @@ def create_user(db: Session, username: str, password: str):
     """
     Create new user in DATABASE
     """
-    logger.info(f"Creating user: {username}")
+    logger.info("Creating user: %s", username)
     
     if not password_valid(password):
         raise WeakPassword("Password too weak")
+    if is_breached(password):
+        raise BreachedPassword("Password appears in a known data breach")
     
     # Check if user exists
-    existing_user = db.query(User).filter(User.username == username).first()
+    existing_user = _find_user(db, username)
     if existing_user:
         raise UserAlreadyExists("User already exists")
     
     # Hash password
-    password_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    password_hash = hash_password(password)
     
+    return _save_user(db, username, password_hash)
+
+
+def _find_user(db: Session, username: str):
+    with DB_QUERY_SECONDS.time("find_user"):
+        return db.query(User).filter(User.username == username).first()
+
+
+def _save_user(db: Session, username: str, password_hash: str):
     # Create User object
     new_user = User(username=username, password_hash=password_hash)
     
-    # Save to database
+    # Save to database (and bump the user counter in the same transaction)
     db.add(new_user)
-    db.commit()
+    db.execute(increment_users())
+    with DB_COMMIT_SECONDS.time("create_user"):
+        db.commit()
     db.refresh(new_user)
     
-    logger.info(f"User created with ID: {new_user.id}")
+    logger.info("User created with ID: %s", new_user.id)
     return new_user
 
 
@@ -79,49 +114,344 @@ def authenticate_user(db: Session, username: str, password: str):
     """
     Authenticate user from DATABASE
     """
-    logger.info(f"Authenticating user: {username}")
+    logger.info("Authenticating user: %s", username)
     
     # Find user
-    user = db.query(User).filter(User.username == username).first()
+    user = _find_user(db, username)
     
     if not user:
         raise InvalidCredentials("User not found")
     
     # Verify password
-    if bcrypt.checkpw(password.encode(), user.password_hash.encode()):
-        logger.info(f"Authentication successful for: {username}")
+    if check_password(password, user.password_hash):
+        logger.info("Authentication successful for: %s", username)
+        if needs_rehash(user.password_hash):
+            _upgrade_hash(db, user, hash_password(password))
         return True
     else:
         raise InvalidCredentials("Invalid password")
 
 
+def _upgrade_hash(db: Session, user: User, password_hash: str):
+    """Store a re-hashed password; a failure here never fails the login"""
+    username = user.username
+    try:
+        user.password_hash = password_hash
+        db.commit()
+        user_cache.invalidate(username)
+        PASSWORD_REHASHES.inc("upgraded")
+        logger.info("Upgraded password hash for: %s", username)
+    except Exception as e:
+        db.rollback()
+        PASSWORD_REHASHES.inc("failed")
+        logger.warning("Password hash upgrade failed for %s: %s", username, e)
+
+
+# ============================================
+# ASYNC DATABASE OPERATIONS
+# ============================================
+# Same rules as above, but on an AsyncSession so concurrent requests
+# interleave on the event loop, and bcrypt runs in the hash pool
+# (app/hashing.py) instead of blocking it.
+async def _find_user_async(db: AsyncSession, username: str):
+    with DB_QUERY_SECONDS.time("find_user"):
+        result = await db.execute(select(User).where(User.username == username))
+        return result.scalars().first()
+
+
+async def _find_credentials_async(db: AsyncSession, username: str):
+    """(id, password_hash) for a login, from the user cache or one narrow query"""
+    record = user_cache.get(username)
+    if record is None:
+        with DB_QUERY_SECONDS.time("find_credentials"):
+            result = await db.execute(
+                select(User.id, User.password_hash).where(User.username == username)
+            )
+            row = result.first()
+        if row is not None:
+            record = tuple(row)
+            user_cache.put(username, *record)
+    return record
+
+
+async def create_user_async(db: AsyncSession, username: str, password: str):
+    """
+    Create new user in DATABASE, hashing in the hash pool
+    
+    `db` is only used for the existence check (it may be read-only); the
+    row is written by the shard's signup writer with SIGNUP_GROUP_COMMIT,
+    else in a session of its own.
+    """
+    logger.info("Creating user: %s", username)
+    
+    if not password_valid(password):
+        AUTH_RESULTS.inc("signup", "weak_password")
+        raise WeakPassword("Password too weak")
+    if is_breached(password):
+        AUTH_RESULTS.inc("signup", "breached_password")
+        raise BreachedPassword("Password appears in a known data breach")
+    
+    # Skip the lookup when the username filter says the name is new;
+    # the unique constraint still catches any race below
+    if username_index.might_exist(username) and await _find_user_async(db, username):
+        AUTH_RESULTS.inc("signup", "already_exists")
+        raise UserAlreadyExists("User already exists")
+    # Hand the reader connection back before hashing; the reader pool is
+    # sized for lookups, not for requests parked on bcrypt
+    await db.rollback()
+    
+    password_hash = await hash_password_async(password)
+    
+    if SIGNUP_GROUP_COMMIT:
+        # Committed together with other signups in flight (app/signup_writer.py)
+        user_id = await signup_writer_for(username).submit(username, password_hash)
+        if user_id is None:
+            AUTH_RESULTS.inc("signup", "already_exists")
+            raise UserAlreadyExists("User already exists")
+        username_index.add(username)
+        AUTH_RESULTS.inc("signup", "created")
+        logger.info("User created with ID: %s", user_id)
+        return User(id=user_id, username=username, password_hash=password_hash)
+    
+    new_user = User(username=username, password_hash=password_hash)
+    async with user_session(username) as writer:
+        writer.add(new_user)
+        try:
+            await writer.execute(increment_users())
+            with DB_COMMIT_SECONDS.time("create_user"):
+                await writer.commit()
+        except IntegrityError:
+            # Another request created the same username while we were hashing
+            await writer.rollback()
+            AUTH_RESULTS.inc("signup", "already_exists")
+            raise UserAlreadyExists("User already exists")
+    
+    username_index.add(username)
+    AUTH_RESULTS.inc("signup", "created")
+    logger.info("User created with ID: %s", new_user.id)
+    return new_user
+
+
+async def authenticate_user_async(db: AsyncSession, username: str, password: str):
+    """
+    Authenticate user from DATABASE, verifying in the hash pool
+    """
+    logger.info("Authenticating user: %s", username)
+    
+    record = None
+    if await username_index.might_exist_async(db, username):
+        record = await _find_credentials_async(db, username)
+    # As in create_user_async: no connection held while the hash pool works
+    await db.rollback()
+    
+    if not record:
+        # Burn the same time as a real check so unknown names don't stand out
+        await check_password_async(password, await dummy_hash_async())
+        AUTH_RESULTS.inc("login", "unknown_user")
+        raise InvalidCredentials("User not found")
+    
+    user_id, password_hash = record
+    if await check_password_async(password, password_hash):
+        AUTH_RESULTS.inc("login", "success")
+        logger.info("Authentication successful for: %s", username)
+        if needs_rehash(password_hash) and username not in _rehashing:
+            # Background work: the login never waits for (or fails on) the upgrade
+            _rehashing[username] = asyncio.create_task(
+                _upgrade_hash_async(user_id, username, password, password_hash)
+            )
+        return True
+    else:
+        AUTH_RESULTS.inc("login", "wrong_password")
+        raise InvalidCredentials("Invalid password")
+
+
+async def authenticate_login_async(username: str, password: str):
+    """
+    authenticate_user_async for /login, in its own read session
+
+    Identical attempts in flight at the same time share one verification
+    (and its outcome); nothing is kept once it completes.
+    """
+    async def verify():
+        async with user_session(username, read_only=True) as db:
+            return await authenticate_user_async(db, username, password)
+
+    if not LOGIN_SINGLE_FLIGHT:
+        return await verify()
+    return await login_flights.run(login_flight_key(username, password), verify)
+
+
+# username -> upgrade task, so repeat logins don't queue a second rehash
+_rehashing = {}
+
+
+async def _upgrade_hash_async(user_id: int, username: str, password: str, old_hash: str):
+    """
+    Async version of _upgrade_hash: hash at the lowest hash-pool priority,
+    then store it in its own session on the user's shard writer
+    """
+    try:
+        password_hash = await hash_password_async(password, background=True)
+        async with user_session(username) as db:
+            try:
+                # Only if the hash is still the one that was checked
+                await db.execute(
+                    update(User)
+                    .where(User.id == user_id, User.password_hash == old_hash)
+                    .values(password_hash=password_hash)
+                )
+                await db.commit()
+            except Exception:
+                await db.rollback()
+                raise
+        user_cache.invalidate(username)
+        PASSWORD_REHASHES.inc("upgraded")
+        logger.info("Upgraded password hash for: %s", username)
+    except Exception as e:
+        PASSWORD_REHASHES.inc("failed")
+        logger.warning("Password hash upgrade failed for %s: %s", username, e)
+    finally:
+        _rehashing.pop(username, None)
+
+
 # ============================================
 # JWT FUNCTIONS
 # ============================================
-def create_access_token(data: dict):
-    """Create JWT token"""
+# Precomputed HS256 encoder/decoder for SECRET_KEY (see app/jwt_codec.py)
+hs256_codec = HS256Codec(SECRET_KEY) if JWT_FAST_HS256 else None
+
+
+def _create_token(data: dict, token_type: str, expires_in: timedelta):
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # exp as the integer timestamp PyJWT would write, so neither encoder copies again
+    expire = int(time.time() + expires_in.total_seconds())
+    # jti identifies the token so it can be revoked before it expires
+    to_encode.update({"exp": expire, "type": token_type, "jti": secrets.token_urlsafe(16)})
     
-    logger.info(f"Creating token with payload: {to_encode}")
-    token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    logger.info(f"Token created: {token[:30]}...")
+    logger.debug("Creating %s token for: %s", token_type, to_encode.get("sub"))
+    keyring = get_keyring()
+    with JWT_SECONDS.time("encode"):
+        if keyring is None and hs256_codec is not None:
+            token = hs256_codec.encode(to_encode)
+        elif keyring is None:
+            token = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+        else:
+            key = keyring.active
+            token = jwt.encode(to_encode, key.private_key, algorithm=key.algorithm,
+                               headers={"kid": key.kid})
     
     return token
 
 
+def create_access_token(data: dict):
+    """Create JWT token"""
+    return _create_token(data, "access", timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+
+
+def create_refresh_token(data: dict):
+    """Create long-lived refresh token (only accepted by /token/refresh)"""
+    return _create_token(data, "refresh", timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+
+
+def _verify_hs256(token: str) -> dict:
+    if hs256_codec is not None:
+        # Our own HS256 tokens; anything unusual falls through to PyJWT
+        payload = hs256_codec.decode(token)
+        if payload is not None:
+            return payload
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
+def _issued_before_cutoff(payload: dict) -> bool:
+    """True for an HS256 token that must have been issued before HS256_CUTOFF"""
+    exp = payload.get("exp")
+    if HS256_CUTOFF is None or not isinstance(exp, (int, float)):
+        return False
+    lifetime = (timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS) if payload.get("type") == "refresh"
+                else timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    # Tokens carry no iat of their own, so the issue time is exp minus the lifetime
+    if exp - lifetime.total_seconds() >= HS256_CUTOFF:
+        return False
+    iat = payload.get("iat", exp)
+    return "iat" not in payload or (isinstance(iat, (int, float)) and iat < HS256_CUTOFF)
+
+
+def _verify_signature(token: str) -> dict:
+    # The key is picked by `kid` and only that key's own algorithm is accepted,
+    # so a token can't pick HS256 and be checked against a public key
+    keyring = get_keyring()
+    if keyring is None:
+        return _verify_hs256(token)
+    kid = jwt.get_unverified_header(token).get("kid")
+    if kid is None:
+        if not JWT_ACCEPT_HS256:
+            raise jwt.InvalidTokenError("Token has no key id")
+        # SECRET_KEY is in the source, so only tokens from before the switch count
+        payload = _verify_hs256(token)
+        if not _issued_before_cutoff(payload):
+            raise jwt.InvalidTokenError("HS256 token issued after JWT_HS256_CUTOFF")
+        return payload
+    key = keyring.get(kid)
+    if key is None:
+        raise jwt.InvalidTokenError(f"Unknown key id {kid}")
+    return jwt.decode(token, key.public_key, algorithms=[key.algorithm])
+
+
+def _decode_token(token: str, token_type=None):
+    # Tokens verified before are served from the cache until they expire
+    payload = token_cache.get(token)
+    
+    if payload is None:
+        try:
+            with JWT_SECONDS.time("decode"):
+                payload = _verify_signature(token)
+            logger.debug("Decode SUCCESS! User: %s", payload.get("sub"))
+            token_cache.put(token, payload)
+        except jwt.ExpiredSignatureError:
+            logger.info("Token expired")
+            raise TokenExpired("Token expired")
+        except jwt.InvalidTokenError as e:
+            logger.warning("Invalid token: %s", e)
+            raise InvalidToken(f"Invalid token: {str(e)}")
+    
+    # Tokens issued before refresh tokens existed carry no type and are access tokens
+    if token_type and payload.get("type", "access") != token_type:
+        raise InvalidToken(f"Invalid token: not an {token_type} token")
+    if revocation_index.is_revoked(payload.get("jti")):
+        raise TokenRevoked("Token revoked")
+    return payload
+
+
 def decode_access_token(token: str):
     """Decode JWT token"""
-    logger.info(f"Attempting to decode token")
-    
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        logger.info(f"Decode SUCCESS! User: {payload.get('sub')}")
-        return payload
-    except jwt.ExpiredSignatureError:
-        logger.error("Token expired")
-        raise InvalidCredentials("Token expired")
-    except jwt.InvalidTokenError as e:
-        logger.error(f"Invalid token: {str(e)}")
-        raise InvalidCredentials(f"Invalid token: {str(e)}")
\ No newline at end of file
+    logger.debug("Attempting to decode token")
+    return _decode_token(token, "access")
+
+
+def decode_refresh_token(token: str):
+    """Decode refresh token"""
+    return _decode_token(token, "refresh")
+
+
+def decode_any_token(token: str):
+    """Decode an access or refresh token (for revocation)"""
+    return _decode_token(token)
+
+
+def verify_access_tokens(tokens: list) -> list:
+    """
+    Check many access tokens at once, one result per token in input order
+
+    Repeated tokens in a batch are verified once. Failures are reported
+    per token by error type instead of raising.
+    """
+    verified = {}
+    for token in tokens:
+        if token in verified:
+            continue
+        try:
+            payload = _decode_token(token, "access")
+            verified[token] = {"valid": True, "sub": payload.get("sub"), "exp": payload.get("exp")}
+        except InvalidCredentials as e:
+            verified[token] = {"valid": False, "error": type(e).__name__, "detail": str(e)}
+    return [verified[token] for token in tokens]
@@ -0,0 +1,148 @@
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+
+from .metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# BREACHED PASSWORD CONFIGURATION
+# ============================================
+# Index built by `python build_breached_index.py`; empty disables the check
+BREACHED_PASSWORDS_FILE = os.getenv("BREACHED_PASSWORDS_FILE", "")
+
+# File layout:
+#   header   MAGIC, digest width (1 byte), padding to HEADER_SIZE
+#   buckets  BUCKET_COUNT + 1 little-endian uint64 entry offsets, one
+#            bucket per leading 2 bytes of the digest
+#   entries  sorted, de-duplicated SHA-1 digests truncated to `width` bytes
+MAGIC = b"BRPWIDX1"
+HEADER_SIZE = 16
+BUCKET_COUNT = 1 << 16
+BUCKET_TABLE = struct.Struct(f"<{BUCKET_COUNT + 1}Q")
+MIN_WIDTH, MAX_WIDTH = 8, 20
+
+BREACH_CHECKS = Counter("breached_password_checks_total", "Breached password lookups", ("result",))
+
+
+def password_digest(password: str) -> bytes:
+    """SHA-1 of the password, the key used by public breach corpora"""
+    return hashlib.sha1(password.encode("utf-8")).digest()
+
+
+class BreachedPasswordIndex:
+    """
+    Read-only, memory-mapped set of breached password digests
+
+    The bucket table narrows a lookup to digests sharing the first two
+    bytes, then a binary search runs over that slice of the file. Pages are
+    only faulted in as they are touched and are shared between workers
+    through the page cache, so a multi-GB list costs almost no RSS.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a breached password index")
+        self.width = self._map[len(MAGIC)]
+        if sys.byteorder == "little":
+            # Offsets read straight from the mapped bucket table as they are needed
+            table = memoryview(self._map)[HEADER_SIZE:HEADER_SIZE + BUCKET_TABLE.size]
+            self._offsets = table.cast("Q")
+        else:
+            self._offsets = BUCKET_TABLE.unpack_from(self._map, HEADER_SIZE)
+        self._entries_start = HEADER_SIZE + BUCKET_TABLE.size
+        self.count = self._offsets[-1]
+
+    def __contains__(self, digest: bytes) -> bool:
+        key = digest[:self.width]
+        bucket = (key[0] << 8) | key[1]
+        lo, hi = self._offsets[bucket], self._offsets[bucket + 1]
+        data, width, start = self._map, self.width, self._entries_start
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = start + mid * width
+            entry = data[pos:pos + width]
+            if entry < key:
+                lo = mid + 1
+            elif entry > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def contains_password(self, password: str) -> bool:
+        return password_digest(password) in self
+
+    def close(self):
+        # The mmap can't be closed while a view of it is still exported
+        offsets = getattr(self, "_offsets", None)
+        if isinstance(offsets, memoryview):
+            offsets.release()
+        self._map.close()
+        self._file.close()
+
+    def stats(self) -> dict:
+        return {"file": self.path, "entries": self.count, "digest_bytes": self.width,
+                "file_bytes": len(self._map)}
+
+
+def write_index(path: str, sorted_digests, width: int) -> int:
+    """
+    Write an index from digests that are already sorted and unique
+
+    `sorted_digests` may be any iterable (e.g. a generator over sorted
+    runs), so the list never has to fit in memory. Returns the entry count.
+    """
+    if not MIN_WIDTH <= width <= MAX_WIDTH:
+        raise ValueError(f"width must be between {MIN_WIDTH} and {MAX_WIDTH}")
+    offsets = [0] * (BUCKET_COUNT + 1)
+    count = 0
+    with open(path, "wb") as f:
+        f.write(MAGIC + bytes([width]) + bytes(HEADER_SIZE - len(MAGIC) - 1))
+        f.write(bytes(BUCKET_TABLE.size))   # filled in once the counts are known
+        for digest in sorted_digests:
+            f.write(digest[:width])
+            offsets[((digest[0] << 8) | digest[1]) + 1] += 1
+            count += 1
+        for bucket in range(BUCKET_COUNT):
+            offsets[bucket + 1] += offsets[bucket]
+        f.seek(HEADER_SIZE)
+        f.write(BUCKET_TABLE.pack(*offsets))
+    return count
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_breached_index():
+    """The configured index, opened on first use, or None when the check is off"""
+    global _index
+    if _index is None and BREACHED_PASSWORDS_FILE:
+        with _index_lock:
+            if _index is None:
+                _index = BreachedPasswordIndex(BREACHED_PASSWORDS_FILE)
+                logger.info("Breached password index: %d entries from %s",
+                            _index.count, BREACHED_PASSWORDS_FILE)
+    return _index
+
+
+def is_breached(password: str) -> bool:
+    """True if the password is in the breached password index"""
+    index = get_breached_index()
+    if index is None:
+        return False
+    if index.contains_password(password):
+        BREACH_CHECKS.inc("breached")
+        return True
+    BREACH_CHECKS.inc("clean")
+    return False
@@ -0,0 +1,316 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .auth_service import password_valid
+from .breached import is_breached
+from .counters import increment_users
+from .database import User, shard_for
+from .hashing import hash_password, hash_password_async, hash_pool, is_supported_hash
+from .username_filter import username_index
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# BULK IMPORT CONFIGURATION
+# ============================================
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "1000"))
+BULK_FORMATS = ("ndjson", "csv")
+# Limits for uploads through the API, which must not grow with the body
+BULK_MAX_LINE_BYTES = int(os.getenv("BULK_MAX_LINE_BYTES", "65536"))
+BULK_MAX_REPORTED_ERRORS = int(os.getenv("BULK_MAX_REPORTED_ERRORS", "1000"))
+EXPORT_COLUMNS = ["id", "username", "password_hash"]
+
+
+# ============================================
+# PARSING (one line at a time, never the whole file)
+# ============================================
+class RecordParser:
+    """
+    Turns NDJSON or CSV lines into user records
+
+    Each record has a `username` and either a plain `password` (hashed on
+    import) or an existing `password_hash` (e.g. from /users/export).
+    CSV input must start with a header row; quoted newlines are not supported.
+    """
+
+    def __init__(self, fmt: str = "ndjson"):
+        if fmt not in BULK_FORMATS:
+            raise ValueError(f"Unknown format: {fmt}")
+        self.fmt = fmt
+        self.header = None
+        self.line_no = 0
+
+    def feed(self, line):
+        """
+        Parse one line; returns a record dict, or None for blank/header lines
+
+        `line` is None for a line too long to read (see aiter_lines).
+        """
+        self.line_no += 1
+        if line is None:
+            return {"line": self.line_no, "error": "InvalidRow"}
+        line = line.strip("\r\n")
+        if not line.strip():
+            return None
+        if self.fmt == "ndjson":
+            try:
+                row = json.loads(line)
+            except ValueError:
+                return {"line": self.line_no, "error": "InvalidRow"}
+            if not isinstance(row, dict):
+                return {"line": self.line_no, "error": "InvalidRow"}
+        else:
+            values = next(csv.reader([line]))
+            if self.header is None:
+                self.header = [v.strip() for v in values]
+                return None
+            row = dict(zip(self.header, values))
+        row["line"] = self.line_no
+        return row
+
+
+def _check_row(row: dict):
+    """Returns an error name for a bad row, or None"""
+    if row.get("error"):
+        return row["error"]
+    username = row.get("username")
+    if not isinstance(username, str) or not username:
+        return "InvalidRow"
+    if row.get("password_hash"):
+        # Stored as-is, so it has to be a hash login can verify against
+        return None if is_supported_hash(row["password_hash"]) else "InvalidRow"
+    password = row.get("password")
+    if not isinstance(password, str):
+        return "InvalidRow"
+    if not password_valid(password):
+        return "WeakPassword"
+    if is_breached(password):
+        return "BreachedPassword"
+    return None
+
+
+def _split_batch(rows, existing: set):
+    """
+    Sort a batch into rows to insert and per-row conflicts
+
+    `existing` holds usernames already in the database. Duplicates inside
+    the batch keep the first occurrence.
+    """
+    accepted, errors, seen = [], [], set()
+    for row in rows:
+        error = _check_row(row)
+        username = row.get("username")
+        if error is None and (username in existing or username in seen):
+            error = "UserAlreadyExists"
+        if error:
+            errors.append({"line": row["line"], "username": username, "error": error})
+            continue
+        seen.add(username)
+        accepted.append(row)
+    return accepted, errors
+
+
+def _usernames(rows):
+    return [r["username"] for r in rows if isinstance(r.get("username"), str)]
+
+
+def _by_shard(rows) -> dict:
+    """Group a batch by the shard each username lives on (rows without one go to shard 0)"""
+    shards = {}
+    for row in rows:
+        username = row.get("username")
+        shard = shard_for(username) if isinstance(username, str) else 0
+        shards.setdefault(shard, []).append(row)
+    return shards
+
+
+def _merge(results) -> dict:
+    errors = sorted((e for r in results for e in r["errors"]), key=lambda e: e["line"])
+    return {"created": sum(r["created"] for r in results), "errors": errors}
+
+
+# ============================================
+# SYNC IMPORT (CLI)
+# ============================================
+def import_batch(db: Session, rows, pool=hash_pool) -> dict:
+    """
+    Insert one batch of records in a single transaction
+
+    Passwords are hashed in parallel across the pool's workers.
+    """
+    existing = set(
+        db.execute(select(User.username).where(User.username.in_(_usernames(rows)))).scalars()
+    )
+    accepted, errors = _split_batch(rows, existing)
+
+    to_hash = [r for r in accepted if not r.get("password_hash")]
+    for row, password_hash in zip(to_hash, pool.map(hash_password, [r["password"] for r in to_hash])):
+        row["password_hash"] = password_hash
+
+    if accepted:
+        values = [{"username": r["username"], "password_hash": r["password_hash"]} for r in accepted]
+        try:
+            db.execute(insert(User), values)
+            db.execute(increment_users(len(values)))
+            db.commit()
+        except IntegrityError:
+            # Someone signed up with one of these names since the SELECT; redo the check
+            db.rollback()
+            retry = import_batch(db, accepted, pool)
+            return {"created": retry["created"], "errors": errors + retry["errors"]}
+    return {"created": len(accepted), "errors": errors}
+
+
+def _import_sharded(dbs, rows, pool) -> dict:
+    return _merge([import_batch(dbs[shard], part, pool) for shard, part in _by_shard(rows).items()])
+
+
+def import_users(dbs, lines, fmt: str = "ndjson", batch_size: int = BULK_BATCH_SIZE, pool=hash_pool):
+    """
+    Stream records from `lines` into the database in batches
+
+    `dbs` holds one session per user shard (see database.shard_sessions).
+    Yields one result dict per batch.
+    """
+    parser = RecordParser(fmt)
+    batch = []
+    for line in lines:
+        row = parser.feed(line)
+        if row is None:
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield _import_sharded(dbs, batch, pool)
+            batch = []
+    if batch:
+        yield _import_sharded(dbs, batch, pool)
+
+
+# ============================================
+# ASYNC IMPORT (API)
+# ============================================
+async def import_batch_async(db: AsyncSession, rows) -> dict:
+    """
+    Async version of import_batch, hashing in the shared hash pool
+
+    The hashing goes through admission control as background work, so a
+    big import only uses workers no signup or login is waiting for.
+    """
+    result = await db.execute(select(User.username).where(User.username.in_(_usernames(rows))))
+    accepted, errors = _split_batch(rows, set(result.scalars()))
+    # Hand the connection back while hashing; the shard may have a single writer
+    await db.rollback()
+
+    to_hash = [r for r in accepted if not r.get("password_hash")]
+    hashes = await asyncio.gather(*(hash_password_async(r["password"], background=True) for r in to_hash))
+    for row, password_hash in zip(to_hash, hashes):
+        row["password_hash"] = password_hash
+
+    if accepted:
+        values = [{"username": r["username"], "password_hash": r["password_hash"]} for r in accepted]
+        try:
+            await db.execute(insert(User), values)
+            await db.execute(increment_users(len(values)))
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            retry = await import_batch_async(db, accepted)
+            return {"created": retry["created"], "errors": errors + retry["errors"]}
+        for row in accepted:
+            username_index.add(row["username"])
+    return {"created": len(accepted), "errors": errors}
+
+
+async def aiter_lines(chunks, max_length: int = BULK_MAX_LINE_BYTES):
+    """
+    Split an async stream of byte chunks into text lines
+
+    A line longer than `max_length` bytes is dropped as it arrives (so a
+    body without newlines can't fill memory) and comes out as None.
+    """
+    buffer, too_long = b"", False
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if too_long or len(line) > max_length:
+                too_long = False
+                yield None
+            else:
+                yield line.decode()
+        if len(buffer) > max_length:
+            too_long, buffer = True, b""
+    if too_long or len(buffer) > max_length:
+        yield None
+    elif buffer:
+        yield buffer.decode()
+
+
+async def _import_sharded_async(dbs, rows) -> dict:
+    # Each shard is its own SQLite file, so their transactions commit concurrently
+    parts = _by_shard(rows)
+    return _merge(await asyncio.gather(*(import_batch_async(dbs[shard], part) for shard, part in parts.items())))
+
+
+async def import_users_async(dbs, lines, fmt: str = "ndjson", batch_size: int = BULK_BATCH_SIZE):
+    """Async version of import_users over an async iterator of lines"""
+    parser = RecordParser(fmt)
+    batch = []
+    async for line in lines:
+        row = parser.feed(line)
+        if row is None:
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield await _import_sharded_async(dbs, batch)
+            batch = []
+    if batch:
+        yield await _import_sharded_async(dbs, batch)
+
+
+# ============================================
+# EXPORT
+# ============================================
+def format_row(row, fmt: str = "ndjson") -> str:
+    """Format one (id, username, password_hash) row as a line"""
+    if fmt == "ndjson":
+        return json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n"
+    out = io.StringIO()
+    csv.writer(out, lineterminator="\n").writerow(row)
+    return out.getvalue()
+
+
+def export_header(fmt: str = "ndjson") -> str:
+    return format_row(EXPORT_COLUMNS, fmt) if fmt == "csv" else ""
+
+
+def export_users(dbs, fmt: str = "ndjson", chunk_size: int = BULK_BATCH_SIZE):
+    """
+    Yield every user as a line, fetching `chunk_size` rows at a time
+
+    Shards are exported one after another; ids are only unique per shard.
+    """
+    yield export_header(fmt)
+    query = select(User.id, User.username, User.password_hash).order_by(User.id)
+    for db in dbs:
+        for row in db.execute(query.execution_options(yield_per=chunk_size)):
+            yield format_row(tuple(row), fmt)
+
+
+async def export_users_async(dbs, fmt: str = "ndjson", chunk_size: int = BULK_BATCH_SIZE):
+    """Async version of export_users using a server-side cursor"""
+    yield export_header(fmt)
+    query = select(User.id, User.username, User.password_hash).order_by(User.id)
+    for db in dbs:
+        result = await db.stream(query.execution_options(yield_per=chunk_size))
+        async for row in result:
+            yield format_row(tuple(row), fmt)
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import os
+
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .database import Counter, User, USERS_COUNTER, async_shard_sessions
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# USER COUNTER
+# ============================================
+# The number of users lives in one row of the `counters` table. Every
+# insert into `users` bumps it in the same transaction, so reading the
+# count is a primary-key lookup instead of a COUNT(*) scan. A periodic
+# reconcile recounts the table to fix any drift (e.g. rows added by hand).
+USER_COUNT_RECONCILE_SECONDS = int(os.getenv("USER_COUNT_RECONCILE_SECONDS", "3600"))
+
+
+def increment_users(n: int = 1):
+    """UPDATE statement that adds n to the user counter (run it before commit)"""
+    return (
+        update(Counter)
+        .where(Counter.name == USERS_COUNTER)
+        .values(value=Counter.value + n)
+    )
+
+
+def _current_count():
+    return select(Counter.value).where(Counter.name == USERS_COUNTER)
+
+
+def _reconcile():
+    recount = select(func.count()).select_from(User).scalar_subquery()
+    stmt = insert(Counter).values(name=USERS_COUNTER, value=recount)
+    return stmt.on_conflict_do_update(
+        index_elements=[Counter.name], set_={"value": stmt.excluded.value}
+    )
+
+
+def get_user_count(db: Session) -> int:
+    """O(1) user count, falling back to COUNT(*) if the counter is missing"""
+    count = db.scalar(_current_count())
+    if count is None:
+        count = db.scalar(select(func.count()).select_from(User))
+    return count
+
+
+async def get_user_count_async(db: AsyncSession) -> int:
+    """Async version of get_user_count"""
+    count = await db.scalar(_current_count())
+    if count is None:
+        count = await db.scalar(select(func.count()).select_from(User))
+    return count
+
+
+def reconcile_user_count(db: Session) -> dict:
+    """Recount the users table and correct the counter"""
+    before = db.scalar(_current_count())
+    db.execute(_reconcile())
+    db.commit()
+    after = db.scalar(_current_count())
+    if before != after:
+        logger.warning("User counter drifted: %s -> %s", before, after)
+    return {"before": before, "after": after, "drift": (after - (before or 0))}
+
+
+async def reconcile_user_count_async(db: AsyncSession) -> dict:
+    """Async version of reconcile_user_count"""
+    before = await db.scalar(_current_count())
+    await db.execute(_reconcile())
+    await db.commit()
+    after = await db.scalar(_current_count())
+    if before != after:
+        logger.warning("User counter drifted: %s -> %s", before, after)
+    return {"before": before, "after": after, "drift": (after - (before or 0))}
+
+
+async def count_all_users_async() -> int:
+    """User count summed over every shard (see USER_SHARDS)"""
+    async with async_shard_sessions(read_only=True) as sessions:
+        counts = await asyncio.gather(*(get_user_count_async(db) for db in sessions))
+    return sum(counts)
+
+
+async def reconcile_all_user_counts_async() -> dict:
+    """Reconcile the counter on every shard; totals plus per-shard results"""
+    async with async_shard_sessions() as sessions:
+        shards = await asyncio.gather(*(reconcile_user_count_async(db) for db in sessions))
+    if len(shards) == 1:
+        return shards[0]
+    return {
+        "before": sum(r["before"] or 0 for r in shards),
+        "after": sum(r["after"] for r in shards),
+        "drift": sum(r["drift"] for r in shards),
+        "shards": shards,
+    }
@@ -1,13 +1,105 @@
-from sqlalchemy import create_engine, Column, String, Integer
+import os
+import zlib
+from contextlib import asynccontextmanager, contextmanager
+
+from sqlalchemy import create_engine, event, inspect, Column, String, Integer, func, insert, literal, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-# Database connection
+# ============================================
+# SQLITE TUNING
+# ============================================
+# With SQLITE_TUNED=1 every connection gets the pragmas below, and the API
+# gets one dedicated writer connection per database file plus a pool of
+# read-only connections. In WAL mode readers never wait for the writer,
+# so login lookups carry on while signups commit. SQLITE_TUNED=0 keeps
+# SQLite's defaults and one shared pool.
+SQLITE_TUNED = os.getenv("SQLITE_TUNED", "1") == "1"
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+# NORMAL in WAL mode survives application crashes; a power cut can lose the last commits
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))   # negative = KiB
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+
+
+def _pragmas(read_only: bool) -> list:
+    pragmas = [
+        f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}",
+        f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = 1")
+    else:
+        # Stored in the file, so readers pick it up without setting it
+        pragmas.insert(0, f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+    return pragmas
+
+
+def _tune(engine, read_only: bool = False):
+    """Apply the SQLITE_* pragmas to every new connection of `engine`"""
+    if not SQLITE_TUNED:
+        return engine
+    pragmas = _pragmas(read_only)
+
+    @event.listens_for(getattr(engine, "sync_engine", engine), "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return engine
+
+
+def _async_engines(path: str):
+    """(writer, reader) async engines for one database file"""
+    url = f"sqlite+aiosqlite:///{path}"
+    if not SQLITE_TUNED:
+        engine = create_async_engine(url)
+        return engine, engine
+    writer = _tune(create_async_engine(url, pool_size=1, max_overflow=0))
+    reader = _tune(create_async_engine(url, pool_size=SQLITE_READ_POOL_SIZE, max_overflow=0), read_only=True)
+    return writer, reader
+
+
+def sqlite_settings() -> dict:
+    """The active SQLite tuning, for diagnostics"""
+    if not SQLITE_TUNED:
+        return {"tuned": False}
+    return {
+        "tuned": True,
+        "journal_mode": SQLITE_JOURNAL_MODE,
+        "synchronous": SQLITE_SYNCHRONOUS,
+        "mmap_size": SQLITE_MMAP_SIZE,
+        "cache_size": SQLITE_CACHE_SIZE,
+        "busy_timeout_ms": SQLITE_BUSY_TIMEOUT_MS,
+        "writer_connections": 1,
+        "reader_connections": SQLITE_READ_POOL_SIZE,
+    }
+
+
+def _session_factory(engine):
+    return async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+
+# Database connection (sync - used by scripts and tools)
 DATABASE_URL = "sqlite:///./users.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+engine = _tune(create_engine(DATABASE_URL, connect_args={"check_same_thread": False}))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async database connection (same file, used by the API through aiosqlite):
+# AsyncSessionLocal for anything that writes, AsyncReadSessionLocal for lookups
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./users.db"
+async_engine, async_read_engine = _async_engines("./users.db")
+AsyncSessionLocal = _session_factory(async_engine)
+AsyncReadSessionLocal = _session_factory(async_read_engine)
+
 # User model (table)
 class User(Base):
     __tablename__ = "users"
@@ -15,18 +107,162 @@ class User(Base):
     username = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)
 
+# Maintained counters (table), e.g. the number of users - see app/counters.py
+class Counter(Base):
+    __tablename__ = "counters"
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+USERS_COUNTER = "users"
+
+# Revoked JWTs (table), kept until they expire - see app/revocation.py
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+    # Workers sync by id, so purged ids must never be handed out again
+    __table_args__ = {"sqlite_autoincrement": True}
+    id = Column(Integer, primary_key=True)
+    jti = Column(String, unique=True, nullable=False)
+    expires_at = Column(Integer, index=True, nullable=False)
+
+# ============================================
+# USER SHARDS
+# ============================================
+# USER_SHARDS > 1 spreads the users table (with its counter) over that many
+# SQLite files by a stable hash of the username, so signups landing on
+# different shards commit in parallel instead of queueing on one writer
+# lock. users.db keeps the other tables. Changing the shard count means
+# moving users with `bulk_users.py export` / `import`.
+USER_SHARDS = max(1, int(os.getenv("USER_SHARDS", "1")))
+USER_SHARD_FILE = os.getenv("USER_SHARD_FILE", "./users_shard{}.db")
+USER_TABLES = [User.__table__, Counter.__table__]
+
+if USER_SHARDS == 1:
+    shard_files = ["users.db"]
+    shard_engines = [engine]
+    async_shard_engines = [async_engine]
+    async_shard_read_engines = [async_read_engine]
+    ShardSessionLocal = [SessionLocal]
+    AsyncShardSessionLocal = [AsyncSessionLocal]
+    AsyncShardReadSessionLocal = [AsyncReadSessionLocal]
+else:
+    shard_files = [USER_SHARD_FILE.format(i) for i in range(USER_SHARDS)]
+    shard_engines = [
+        _tune(create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}))
+        for path in shard_files
+    ]
+    async_shard_engines, async_shard_read_engines = map(list, zip(*map(_async_engines, shard_files)))
+    ShardSessionLocal = [sessionmaker(autocommit=False, autoflush=False, bind=e) for e in shard_engines]
+    AsyncShardSessionLocal = [_session_factory(e) for e in async_shard_engines]
+    AsyncShardReadSessionLocal = [_session_factory(e) for e in async_shard_read_engines]
+
+# Every async pool, writers and readers (deduplicated when they are shared)
+async_engines = list(dict.fromkeys(
+    [async_engine, async_read_engine, *async_shard_engines, *async_shard_read_engines]
+))
+
+
+def shard_for(username: str) -> int:
+    """Shard holding `username` (crc32, so every process agrees)"""
+    if USER_SHARDS == 1:
+        return 0
+    return zlib.crc32(username.encode()) % USER_SHARDS
+
+
+def user_session(username: str, read_only: bool = False):
+    """New async session on the shard holding `username` (read_only: a reader connection)"""
+    factories = AsyncShardReadSessionLocal if read_only else AsyncShardSessionLocal
+    return factories[shard_for(username)]()
+
+
+@contextmanager
+def shard_sessions():
+    """One sync session per shard, indexed by shard number"""
+    sessions = [Session() for Session in ShardSessionLocal]
+    try:
+        yield sessions
+    finally:
+        for db in sessions:
+            db.close()
+
+
+@asynccontextmanager
+async def async_shard_sessions(read_only: bool = False):
+    """Async version of shard_sessions (read_only: on reader connections)"""
+    factories = AsyncShardReadSessionLocal if read_only else AsyncShardSessionLocal
+    sessions = [Session() for Session in factories]
+    try:
+        yield sessions
+    finally:
+        for db in sessions:
+            await db.close()
+
+
+async def dispose_engines():
+    """Close every async connection pool (primary and shards)"""
+    for e in async_engines:
+        await e.dispose()
+
+
 # Create tables
 def create_tables():
     print("🔄 Creating database tables...")
-    Base.metadata.create_all(bind=engine)
+    other_tables = [t for t in Base.metadata.sorted_tables if t not in USER_TABLES]
+    Base.metadata.create_all(bind=engine, tables=other_tables)
+    for shard_engine in shard_engines:
+        Base.metadata.create_all(bind=shard_engine, tables=USER_TABLES)
+        _seed_user_counter(shard_engine)
     print("✅ Database tables created!")
-    print(f"📁 Database file should be at: users.db")
+    print(f"📁 Database file should be at: users.db"
+          + (f" (users in {', '.join(shard_files)})" if USER_SHARDS > 1 else ""))
+
+
+def _seed_user_counter(shard_engine):
+    # Seed the user counter from the table the first time
+    with shard_engine.begin() as conn:
+        conn.execute(
+            insert(Counter).prefix_with("OR IGNORE").from_select(
+                ["name", "value"],
+                select(literal(USERS_COUNTER), func.count()).select_from(User),
+            )
+        )
+
+
+def upgrade_tables() -> list:
+    """
+    Create tables added since an existing database was set up
+
+    Runs at every startup without CREATE_TABLES, so a deployment that
+    upgrades gets e.g. `counters` and `revoked_tokens`. A database with no
+    users table is not upgraded: it is new (or the wrong directory), and
+    is only created with CREATE_TABLES=1. Returns the tables created.
+    """
+    created = []
+    for shard_engine in shard_engines:
+        if not inspect(shard_engine).has_table(User.__tablename__):
+            raise RuntimeError(f"No users table in {shard_engine.url.database}; "
+                               "start once with CREATE_TABLES=1 to create the database")
+    other_tables = [t for t in Base.metadata.sorted_tables if t not in USER_TABLES]
+    for bind, tables in [(engine, other_tables)] + [(e, USER_TABLES) for e in shard_engines]:
+        existing = set(inspect(bind).get_table_names())
+        missing = [t for t in tables if t.name not in existing]
+        if missing:
+            Base.metadata.create_all(bind=bind, tables=missing)
+            created += [f"{bind.url.database}:{t.name}" for t in missing]
+        if Counter.__table__ in missing:
+            _seed_user_counter(bind)
+    return created
 
 
 # Database dependency
-def get_db():
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Blocking session for code that cannot await (scripts, tools)
+def get_sync_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,295 @@
+import asyncio
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from .admission import AdmissionController
+from .metrics import Gauge, PASSWORD_HASH_SECONDS, HASH_POOL_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# HASH POOL CONFIGURATION
+# ============================================
+# "thread" works well because bcrypt and argon2 release the GIL while hashing.
+# "process" sidesteps the GIL entirely at the cost of pickling each job.
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "thread")
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", os.cpu_count() or 1))
+
+# ============================================
+# PASSWORD HASHER CONFIGURATION
+# ============================================
+# New hashes use PASSWORD_HASHER; existing hashes of any supported kind keep
+# verifying and are upgraded on the user's next successful login.
+# Run `python calibrate_hasher.py` to pick values for a target latency.
+PASSWORD_HASHER = os.getenv("PASSWORD_HASHER", "bcrypt")   # "bcrypt" or "argon2id"
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "65536"))   # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "4"))
+
+
+# ============================================
+# HASHERS
+# ============================================
+class BcryptHasher:
+    name = "bcrypt"
+    # "$2b$12$" + 22 characters of salt + 31 of hash
+    FORMAT = re.compile(r"\$2[aby]\$\d\d\$[./A-Za-z0-9]{53}")
+
+    def __init__(self, rounds: int = BCRYPT_ROUNDS):
+        self.rounds = rounds
+
+    @classmethod
+    def identifies(cls, password_hash: str) -> bool:
+        return cls.FORMAT.fullmatch(password_hash) is not None
+
+    def hash(self, password: str) -> str:
+        return bcrypt.hashpw(password.encode(), bcrypt.gensalt(self.rounds)).decode()
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        return bcrypt.checkpw(password.encode(), password_hash.encode())
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        # "$2b$12$..." -> cost 12
+        return int(password_hash.split("$")[2]) != self.rounds
+
+
+class Argon2Hasher:
+    name = "argon2id"
+    # PHC string, e.g. "$argon2id$v=19$m=65536,t=3,p=4$<salt>$<hash>"
+    FORMAT = re.compile(r"\$argon2(id|i|d)\$v=\d+\$m=\d+,t=\d+,p=\d+\$[A-Za-z0-9+/]+\$[A-Za-z0-9+/]+")
+
+    def __init__(self, time_cost: int = ARGON2_TIME_COST, memory_cost: int = ARGON2_MEMORY_COST,
+                 parallelism: int = ARGON2_PARALLELISM):
+        # Imported here: argon2-cffi is only needed when argon2id hashes are in use
+        try:
+            import argon2
+        except ImportError:
+            raise RuntimeError("argon2id hashing and stored $argon2 hashes need the argon2-cffi package")
+        self._verification_error = argon2.exceptions.VerificationError
+        self.time_cost, self.memory_cost, self.parallelism = time_cost, memory_cost, parallelism
+        self._hasher = argon2.PasswordHasher(
+            time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism,
+            type=argon2.Type.ID,
+        )
+
+    @classmethod
+    def identifies(cls, password_hash: str) -> bool:
+        return cls.FORMAT.fullmatch(password_hash) is not None
+
+    def hash(self, password: str) -> str:
+        return self._hasher.hash(password)
+
+    def verify(self, password: str, password_hash: str) -> bool:
+        try:
+            return self._hasher.verify(password_hash, password)
+        except self._verification_error:
+            return False
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return self._hasher.check_needs_rehash(password_hash)
+
+
+HASHERS = {"bcrypt": BcryptHasher, "argon2id": Argon2Hasher}
+
+_hasher = None
+_verifiers = {}
+
+
+def get_hasher():
+    """The hasher new passwords are hashed with"""
+    global _hasher
+    if _hasher is None:
+        if PASSWORD_HASHER not in HASHERS:
+            raise ValueError(f"Unknown PASSWORD_HASHER: {PASSWORD_HASHER}")
+        _hasher = HASHERS[PASSWORD_HASHER]()
+    return _hasher
+
+
+def _hasher_for(password_hash: str):
+    current = get_hasher()
+    if current.identifies(password_hash):
+        return current
+    for name, cls in HASHERS.items():
+        if cls.identifies(password_hash):
+            if name not in _verifiers:
+                _verifiers[name] = cls()
+            return _verifiers[name]
+    raise ValueError("Unsupported password hash format")
+
+
+# ============================================
+# RAW HASH FUNCTIONS (run inside the pool)
+# ============================================
+def hash_password(password: str) -> str:
+    """Hash a password with the configured hasher"""
+    return get_hasher().hash(password)
+
+
+def is_supported_hash(password_hash) -> bool:
+    """True if some hasher in HASHERS can verify against this stored hash"""
+    return isinstance(password_hash, str) and any(cls.identifies(password_hash) for cls in HASHERS.values())
+
+
+def check_password(password: str, password_hash: str) -> bool:
+    """Check a password against a hash made by any supported hasher"""
+    try:
+        return _hasher_for(password_hash).verify(password, password_hash)
+    except ValueError:
+        # Unknown or malformed stored hash (argon2's InvalidHashError is a
+        # ValueError too): no password matches it
+        return False
+    except RuntimeError as e:
+        # A stored hash whose library isn't installed (e.g. argon2-cffi)
+        logger.error("Cannot verify password hash: %s", e)
+        return False
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """True if the hash uses another algorithm or other parameters than configured"""
+    current = get_hasher()
+    return not current.identifies(password_hash) or current.needs_rehash(password_hash)
+
+
+def _timed(func, *args):
+    """Run func inside a worker and report how long it kept the worker busy"""
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+# ============================================
+# BOUNDED EXECUTOR
+# ============================================
+class HashPool:
+    """
+    Fixed-size executor for password hashing
+
+    Keeps CPU-heavy hashing work off the event loop and off the
+    Starlette threadpool, and counts jobs so saturation can be reported.
+    """
+
+    def __init__(self, kind: str = HASH_EXECUTOR, size: int = HASH_POOL_SIZE):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown hash executor: {kind}")
+        self.kind = kind
+        self.size = max(1, size)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.kind == "process":
+                        # multiprocessing is only imported when it is used
+                        from concurrent.futures import ProcessPoolExecutor
+                        self._executor = ProcessPoolExecutor(max_workers=self.size)
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.size, thread_name_prefix="hash"
+                        )
+        return self._executor
+
+    async def run(self, func, *args):
+        """Run func(*args) in the pool and await the result"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._in_flight += 1
+        submitted = time.perf_counter()
+        try:
+            result, busy = await loop.run_in_executor(self._get_executor(), _timed, func, *args)
+            waited = time.perf_counter() - submitted - busy
+            PASSWORD_HASH_SECONDS.observe(busy, func.__name__)
+            HASH_POOL_WAIT_SECONDS.observe(max(0.0, waited), func.__name__)
+            return result
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+
+    def warm(self):
+        """Start every worker now rather than during the first logins"""
+        executor = self._get_executor()
+        for future in [executor.submit(time.sleep, 0.01) for _ in range(self.size)]:
+            future.result()
+
+    def map(self, func, *iterables):
+        """Blocking parallel map over the pool (for batch jobs and scripts)"""
+        chunksize = 16 if self.kind == "process" else 1
+        return list(self._get_executor().map(func, *iterables, chunksize=chunksize))
+
+    def stats(self) -> dict:
+        """Current pool usage"""
+        in_flight = self._in_flight
+        return {
+            "executor": self.kind,
+            "size": self.size,
+            "in_flight": in_flight,
+            "busy_workers": min(in_flight, self.size),
+            "queued": max(0, in_flight - self.size),
+            "saturated": in_flight >= self.size,
+            "completed": self._completed,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+hash_pool = HashPool()
+
+Gauge("hash_pool_size", "Password hashing workers", lambda: hash_pool.size)
+Gauge("hash_pool_in_flight", "Hashing jobs running or queued", lambda: hash_pool.stats()["in_flight"])
+Gauge("hash_pool_queued", "Hashing jobs waiting for a worker", lambda: hash_pool.stats()["queued"])
+
+# Request-path hashing is admitted here first (see app/admission.py); bulk
+# jobs call hash_pool directly and are not subject to the queue limit
+hash_admission = AdmissionController(hash_pool.size)
+
+Gauge("hash_admission_queue_depth", "Hashing jobs waiting to be admitted", lambda: len(hash_admission._waiters))
+Gauge("hash_admission_priority_in_flight", "Token-only requests currently ahead of hashing",
+      lambda: hash_admission._priority)
+
+
+async def hash_password_async(password: str, background: bool = False) -> str:
+    """
+    Hash a password in the hash pool; raises Overloaded if the queue is full
+
+    background: wait behind every request's hashing instead (bulk import);
+    never rejected.
+    """
+    async with hash_admission.slot(background):
+        return await hash_pool.run(hash_password, password)
+
+
+async def check_password_async(password: str, password_hash: str) -> bool:
+    """Check a password in the hash pool; raises Overloaded if the queue is full"""
+    async with hash_admission.slot():
+        return await hash_pool.run(check_password, password, password_hash)
+
+
+_dummy_hash = None
+
+
+async def dummy_hash_async() -> str:
+    """
+    Hash of a random password, made with the configured hasher
+
+    Checking a password against it costs the same as a real check, so
+    logins for unknown usernames take as long as wrong-password logins.
+    """
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = await hash_password_async(secrets.token_urlsafe(16))
+    return _dummy_hash
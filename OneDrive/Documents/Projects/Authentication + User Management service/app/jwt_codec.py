@@ -0,0 +1,106 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import os
+import time
+from calendar import timegm
+from datetime import datetime
+
+import jwt
+
+# ============================================
+# HS256 FAST PATH CONFIGURATION
+# ============================================
+# PyJWT rebuilds the header, looks up the algorithm, prepares the key and
+# creates a JSON encoder on every call. For the service's own HS256 tokens
+# all of that is fixed, so it is done once here. Tokens come out
+# byte-for-byte as jwt.encode(payload, key, algorithm="HS256") makes them
+# (checked by benchmarks/bench_jwt.py).
+JWT_FAST_HS256 = os.getenv("JWT_FAST_HS256", "1") == "1"
+
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+# What PyJWT writes for algorithm="HS256" with no extra headers (keys sorted)
+HEADER_SEGMENT = _b64encode(b'{"alg":"HS256","typ":"JWT"}').decode()
+_HEADER_PREFIX = HEADER_SEGMENT.encode() + b"."
+
+# json.dumps(..., separators=...) builds a new encoder per call; this one is reused
+_compact_json = json.JSONEncoder(separators=(",", ":"))
+
+_TIME_CLAIMS = ("exp", "iat", "nbf")
+
+
+class HS256Codec:
+    """
+    HS256 JWT encode/decode with the header and HMAC key precomputed
+
+    decode() only takes the fast path for the tokens this service issues:
+    the standard header, a valid signature and claims it can check exactly
+    as PyJWT would. For anything else it returns None and the caller falls
+    back to jwt.decode, so errors and edge cases stay PyJWT's.
+    """
+
+    def __init__(self, secret):
+        key = secret.encode() if isinstance(secret, str) else secret
+        # HMAC state after absorbing the key pads; copy() skips that work per token
+        self._mac = hmac.new(key, digestmod=hashlib.sha256)
+
+    def _sign(self, signing_input: bytes) -> bytes:
+        mac = self._mac.copy()
+        mac.update(signing_input)
+        return mac.digest()
+
+    def encode(self, payload: dict) -> str:
+        """Same token as jwt.encode(payload, secret, algorithm="HS256")"""
+        if any(isinstance(payload.get(claim), datetime) for claim in _TIME_CLAIMS):
+            payload = dict(payload)
+            for claim in _TIME_CLAIMS:
+                if isinstance(payload.get(claim), datetime):
+                    payload[claim] = timegm(payload[claim].utctimetuple())
+        if "iss" in payload and not isinstance(payload["iss"], str):
+            raise TypeError("Issuer (iss) must be a string.")
+        signing_input = _HEADER_PREFIX + _b64encode(_compact_json.encode(payload).encode())
+        return (signing_input + b"." + _b64encode(self._sign(signing_input))).decode()
+
+    def decode(self, token: str):
+        """
+        Payload of a valid token, or None to let PyJWT decide
+
+        Raises jwt.ExpiredSignatureError for an expired token, like jwt.decode.
+        """
+        if not token.startswith(HEADER_SEGMENT + "."):
+            return None
+        signing_input, _, signature = token.rpartition(".")
+        if signing_input.count(".") != 1:
+            return None
+        try:
+            if not hmac.compare_digest(self._sign(signing_input.encode("ascii")), _b64decode(signature)):
+                return None
+            payload = json.loads(_b64decode(signing_input[len(HEADER_SEGMENT) + 1:]))
+        except (ValueError, binascii.Error):   # also covers non-ASCII input and bad JSON
+            return None
+        if not self._checkable(payload):
+            return None
+        if payload["exp"] <= time.time():
+            raise jwt.ExpiredSignatureError("Signature has expired")
+        return payload
+
+    @staticmethod
+    def _checkable(payload) -> bool:
+        """True if validating the claims is just the exp check (PyJWT validates the rest)"""
+        return (
+            isinstance(payload, dict)
+            and type(payload.get("exp")) is int
+            and not any(claim in payload for claim in ("iat", "nbf", "aud"))
+            and isinstance(payload.get("sub", ""), str)
+            and isinstance(payload.get("jti", ""), str)
+        )
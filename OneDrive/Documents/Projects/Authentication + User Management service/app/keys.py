@@ -0,0 +1,218 @@
+import hashlib
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# SIGNING KEY CONFIGURATION
+# ============================================
+# HS256 keeps using the shared SECRET_KEY. EdDSA / RS256 sign with private
+# keys from JWT_KEYS_DIR, published at /.well-known/jwks.json so other
+# services can verify tokens locally (needs the `cryptography` package).
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR", "./keys")
+# Pin the signing key; by default the newest key in JWT_KEYS_DIR signs
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID", "")
+# Opt-in while switching algorithms: keep accepting HS256 tokens without a
+# kid, but only those issued before JWT_HS256_CUTOFF (the switch-over, as
+# Unix seconds or ISO 8601 UTC), so acceptance ends one token lifetime later
+JWT_ACCEPT_HS256 = os.getenv("JWT_ACCEPT_HS256", "0") == "1"
+JWT_HS256_CUTOFF = os.getenv("JWT_HS256_CUTOFF", "")
+# An unknown kid triggers a reload of JWT_KEYS_DIR at most this often
+KEY_RELOAD_MIN_SECONDS = 10
+ASYMMETRIC_ALGORITHMS = ("EdDSA", "RS256")
+
+
+def _parse_cutoff(value: str):
+    """Unix timestamp for JWT_HS256_CUTOFF, or None if unset or unreadable"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+HS256_CUTOFF = _parse_cutoff(JWT_HS256_CUTOFF)
+
+
+class SigningKey:
+    def __init__(self, kid: str, private_key, created: float):
+        from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+        self.kid = kid
+        self.private_key = private_key
+        self.public_key = private_key.public_key()
+        self.created = created
+        if isinstance(private_key, ed25519.Ed25519PrivateKey):
+            self.algorithm = "EdDSA"
+        elif isinstance(private_key, rsa.RSAPrivateKey):
+            self.algorithm = "RS256"
+        else:
+            raise ValueError(f"Unsupported key type for kid {kid}")
+
+    def jwk(self) -> dict:
+        from jwt.algorithms import OKPAlgorithm, RSAAlgorithm
+
+        to_jwk = OKPAlgorithm.to_jwk if self.algorithm == "EdDSA" else RSAAlgorithm.to_jwk
+        jwk = to_jwk(self.public_key, as_dict=True)
+        jwk.update({"kid": self.kid, "alg": self.algorithm, "use": "sig"})
+        return jwk
+
+
+def _generate_private_key(algorithm: str):
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+    if algorithm == "RS256":
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    raise ValueError(f"Cannot generate keys for {algorithm}")
+
+
+class KeyRing:
+    """
+    Signing keys indexed by `kid`, one PEM file per key
+
+    The active key signs new tokens; older keys stay in the ring (and in
+    the JWKS) so tokens they signed keep verifying until they are pruned.
+    """
+
+    def __init__(self, directory: str = JWT_KEYS_DIR, algorithm: str = JWT_ALGORITHM):
+        self.directory = directory
+        self.algorithm = algorithm
+        self.keys = {}
+        self.active = None
+        self._jwks = None
+        self._lock = threading.Lock()
+        self._last_load = 0.0
+
+    def load(self, create_missing: bool = True):
+        """Read every <kid>.pem in the directory, creating a first key if there is none"""
+        from cryptography.hazmat.primitives import serialization
+
+        keys = {}
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if not name.endswith(".pem"):
+                    continue
+                path = os.path.join(self.directory, name)
+                with open(path, "rb") as f:
+                    private_key = serialization.load_pem_private_key(f.read(), password=None)
+                kid = name[:-len(".pem")]
+                keys[kid] = SigningKey(kid, private_key, os.path.getmtime(path))
+
+        with self._lock:
+            self.keys = keys
+            self._jwks = None
+            self._last_load = time.monotonic()
+            if JWT_ACTIVE_KID and JWT_ACTIVE_KID in keys:
+                self.active = keys[JWT_ACTIVE_KID]
+            else:
+                self.active = max(keys.values(), key=lambda k: k.created, default=None)
+
+        if self.active is None and create_missing:
+            self.rotate()
+        logger.info("Loaded %d signing key(s), active kid: %s",
+                    len(self.keys), self.active.kid if self.active else None)
+
+    def get(self, kid: str):
+        """Key for `kid`, reloading the directory once if another worker rotated"""
+        key = self.keys.get(kid)
+        if key is None and time.monotonic() - self._last_load > KEY_RELOAD_MIN_SECONDS:
+            self.load()
+            key = self.keys.get(kid)
+        return key
+
+    def rotate(self) -> SigningKey:
+        """Generate a new key, save it and make it the active signing key"""
+        from cryptography.hazmat.primitives import serialization
+
+        private_key = _generate_private_key(self.algorithm)
+        kid = f"{datetime.utcnow():%Y%m%d}-{secrets.token_hex(4)}"
+        pem = private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{kid}.pem")
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(pem)
+
+        key = SigningKey(kid, private_key, time.time())
+        with self._lock:
+            self.keys = {**self.keys, kid: key}
+            self.active = key
+            self._jwks = None
+        logger.info("Rotated signing key, new kid: %s", kid)
+        return key
+
+    def prune(self, max_age_seconds: float) -> list:
+        """Delete non-active keys older than max_age_seconds (longer than any token's lifetime)"""
+        cutoff = time.time() - max_age_seconds
+        removed = []
+        for kid, key in list(self.keys.items()):
+            if key is not self.active and key.created < cutoff:
+                os.remove(os.path.join(self.directory, f"{kid}.pem"))
+                removed.append(kid)
+        with self._lock:
+            self.keys = {kid: key for kid, key in self.keys.items() if kid not in removed}
+            self._jwks = None
+        return removed
+
+    def jwks(self):
+        """(JSON body, ETag) of the public key set; rebuilt only when keys change"""
+        with self._lock:
+            if self._jwks is None:
+                keys = sorted(self.keys.values(), key=lambda k: k.created, reverse=True)
+                body = json.dumps({"keys": [k.jwk() for k in keys]})
+                self._jwks = (body, '"' + hashlib.sha256(body.encode()).hexdigest()[:16] + '"')
+            return self._jwks
+
+
+def _require_cryptography():
+    # Checked at import so a missing package stops startup, not the first login
+    try:
+        import cryptography  # noqa: F401
+    except ImportError:
+        raise RuntimeError(f"JWT_ALGORITHM={JWT_ALGORITHM} needs the cryptography package "
+                           "(pip install 'PyJWT[crypto]')")
+
+
+if JWT_ALGORITHM in ASYMMETRIC_ALGORITHMS:
+    _require_cryptography()
+keyring = KeyRing() if JWT_ALGORITHM in ASYMMETRIC_ALGORITHMS else None
+
+
+def get_keyring():
+    """The loaded keyring, or None when signing with the shared HS256 secret"""
+    if keyring is not None and keyring.active is None:
+        keyring.load()
+    return keyring
+
+
+def log_legacy_hs256():
+    """Startup warning while kid-less HS256 tokens are still accepted next to key pairs"""
+    if JWT_ALGORITHM not in ASYMMETRIC_ALGORITHMS or not JWT_ACCEPT_HS256:
+        return
+    if HS256_CUTOFF is None:
+        logger.error("JWT_ACCEPT_HS256=1 needs JWT_HS256_CUTOFF (the switch-over time); "
+                     "rejecting all HS256 tokens until it is set")
+        return
+    logger.warning("Accepting legacy HS256 tokens issued before %s; unset JWT_ACCEPT_HS256 "
+                   "once they have expired", datetime.fromtimestamp(HS256_CUTOFF, timezone.utc).isoformat())
@@ -0,0 +1,136 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+
+# ============================================
+# LOGGING CONFIGURATION
+# ============================================
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")        # "text" or "json"
+LOG_QUEUE = os.getenv("LOG_QUEUE", "1") == "1"      # hand records to a background thread
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Per-route overrides, e.g. "/protected=WARNING,/login=INFO"
+LOG_ROUTE_LEVELS = os.getenv("LOG_ROUTE_LEVELS", "")
+# Fraction of INFO/DEBUG records kept per route, e.g. "/protected=0.01"
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Route of the request being handled (set by the request middleware)
+current_route = contextvars.ContextVar("current_route", default=None)
+
+
+def _parse_pairs(spec: str, convert):
+    pairs = {}
+    for item in spec.split(","):
+        if "=" in item:
+            key, value = item.rsplit("=", 1)
+            pairs[key.strip()] = convert(value.strip())
+    return pairs
+
+
+class RouteFilter(logging.Filter):
+    """
+    Drops records per route before they are queued
+
+    Runs on the request's thread, so rejected records cost one dict lookup
+    and are never formatted. WARNING and above are never sampled away.
+    """
+
+    def __init__(self, levels: dict, sample_rates: dict):
+        super().__init__()
+        self.levels = levels
+        self.sample_rates = sample_rates
+
+    def filter(self, record):
+        route = current_route.get()
+        if route is None:
+            return True
+        level = self.levels.get(route)
+        if level is not None and record.levelno < level:
+            return False
+        rate = self.sample_rates.get(route)
+        if rate is not None and record.levelno < logging.WARNING and random.random() >= rate:
+            return False
+        record.route = route
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        route = getattr(record, "route", None)
+        if route:
+            entry["route"] = route
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread
+
+    The stock handler formats the message before queueing; here the
+    record (with its args) is queued as-is. A full queue drops the record
+    instead of blocking the event loop.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+_listener = None
+
+
+def setup_logging():
+    """Configure the root logger from the LOG_* environment variables"""
+    global _listener
+
+    formatter = JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    output = logging.StreamHandler()
+    output.setFormatter(formatter)
+
+    route_filter = RouteFilter(
+        _parse_pairs(LOG_ROUTE_LEVELS, lambda name: logging.getLevelName(name.upper())),
+        _parse_pairs(LOG_SAMPLE_RATES, float),
+    )
+
+    if LOG_QUEUE:
+        handler = LazyQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        _listener = logging.handlers.QueueListener(handler.queue, output)
+        _listener.start()
+        atexit.register(stop_logging)
+    else:
+        handler = output
+    handler.addFilter(route_filter)
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,161 @@
+import bisect
+import threading
+import time
+
+# ============================================
+# METRICS (Prometheus text format)
+# ============================================
+# A tiny in-process registry: histograms and counters keyed by a tuple of
+# label values, plus gauges read from callbacks when /metrics is scraped.
+# Recording is a bisect and two additions under an uncontended lock.
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_registry = []
+
+
+def _label_text(names, values, extra=""):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter"""
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield f"{self.name}{_label_text(self.labels, label_values)} {value}"
+
+
+class _Timer:
+    __slots__ = ("histogram", "label_values", "started")
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.label_values)
+
+
+class Histogram:
+    """Latency histogram in seconds with cumulative buckets"""
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}   # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *label_values):
+        """Context manager that observes the elapsed time of its block"""
+        return _Timer(self, label_values)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            all_series = [(k, list(v)) for k, v in sorted(self._series.items())]
+        for label_values, series in all_series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                labels = _label_text(self.labels, label_values, f'le="{bound}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _label_text(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {series[-1]}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Gauge:
+    """
+    Metric whose value(s) come from a callback at scrape time
+
+    Use kind="counter" for running totals kept elsewhere (e.g. cache hits).
+    A callback may return a number, or a dict of label values -> number.
+    """
+
+    def __init__(self, name: str, help: str, callback, labels=(), kind: str = "gauge"):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.callback = callback
+        self.kind = kind
+        _registry.append(self)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        value = self.callback()
+        if isinstance(value, dict):
+            for label_values, v in sorted(value.items()):
+                yield f"{self.name}{_label_text(self.labels, label_values)} {v}"
+        else:
+            yield f"{self.name} {value}"
+
+
+def render_metrics() -> str:
+    """All registered metrics in Prometheus exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ============================================
+# SHARED METRICS
+# ============================================
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_seconds", "Time spent inside the password hasher", ("operation",)
+)
+HASH_POOL_WAIT_SECONDS = Histogram(
+    "hash_pool_wait_seconds", "Time a hashing job waited for a pool worker", ("operation",)
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds", "Database query latency", ("query",)
+)
+PASSWORD_REHASHES = Counter(
+    "password_rehashes_total", "Outdated password hashes upgraded at login", ("result",)
+)
+DB_COMMIT_SECONDS = Histogram(
+    "db_commit_seconds", "Database commit latency", ("operation",)
+)
+JWT_SECONDS = Histogram(
+    "jwt_seconds", "JWT encode/decode latency (decode only on cache misses)", ("operation",)
+)
+AUTH_RESULTS = Counter(
+    "auth_results_total", "Outcomes of signup and login attempts", ("operation", "result")
+)
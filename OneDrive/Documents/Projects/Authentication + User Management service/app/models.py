@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic import BaseModel
 
 class SignupRequest(BaseModel):
@@ -7,3 +9,12 @@ class SignupRequest(BaseModel):
 class LoginRequest(BaseModel):
     username: str
     password: str
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class RevokeRequest(BaseModel):
+    token: str
+
+class VerifyBatchRequest(BaseModel):
+    tokens: List[str]
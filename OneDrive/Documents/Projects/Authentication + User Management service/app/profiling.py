@@ -0,0 +1,251 @@
+import asyncio
+import collections
+import contextvars
+import hmac
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# REQUEST PROFILING CONFIGURATION
+# ============================================
+# Off by default, and then the middleware is not even installed. When on,
+# a request is profiled if it sends "X-Profile: 1" with a valid
+# X-Admin-Token, or is picked by PROFILE_SAMPLE_RATE.
+PROFILE_ENABLED = os.getenv("PROFILE_ENABLED", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+PROFILE_SUFFIX = ".folded"
+
+# The profile of the request being handled; copied into threadpool workers
+# with the rest of the context, which is how their samples are attributed
+_current_profile = contextvars.ContextVar("current_profile", default=None)
+
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _label(code) -> str:
+    """Flame graph frame name: qualified function name and where it is defined"""
+    path = code.co_filename
+    if path.startswith(_PROJECT_DIR):
+        path = os.path.relpath(path, _PROJECT_DIR)
+    else:
+        path = "/".join(path.split(os.sep)[-2:])
+    # ";" separates frames in the folded format
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({path}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _thread_stack(frame) -> list:
+    """Frames of a thread, outermost first"""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def _await_chain(awaitable) -> list:
+    """Labels of a suspended coroutine and everything it is awaiting"""
+    labels = []
+    while awaitable is not None:
+        frame = (getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+                 or getattr(awaitable, "ag_frame", None))
+        if frame is None:
+            kind = type(awaitable).__name__
+            labels.append(f"[await {'Future' if kind == 'FutureIter' else kind}]")
+            break
+        labels.append(_label(frame.f_code))
+        awaitable = (getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+                     or getattr(awaitable, "ag_await", None))
+    return labels
+
+
+class RequestProfile:
+    """Wall-clock stack samples for one request, in folded-stack form"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.task = asyncio.current_task()
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.samples = collections.Counter()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        slug = path.strip("/").replace("/", "_") or "root"
+        self.name = f"{datetime.now():%Y%m%d-%H%M%S}-{method}-{slug}-{id(self) & 0xffff:04x}{PROFILE_SUFFIX}"
+
+    def sample(self, frames: dict):
+        """Record where this request is right now, given sys._current_frames()"""
+        coro = self.task.get_coro()
+        root = getattr(coro, "cr_frame", None)
+        if root is None:
+            return
+        if asyncio.current_task(self.loop) is self.task:
+            # Running on the event loop: the real stack, from the request's root coroutine up
+            stack = _thread_stack(frames.get(self.loop_thread))
+            if root in stack:
+                labels = [_label(f.f_code) for f in stack[stack.index(root):]]
+                self.samples[";".join(labels)] += 1
+            return
+
+        # Suspended: where it is awaiting, plus any threadpool worker running for it
+        labels = _await_chain(coro)
+        for thread_id, frame in frames.items():
+            if thread_id != self.loop_thread:
+                worker = self._worker_frames(frame)
+                if worker:
+                    labels.extend(worker)
+                    break
+        self.samples[";".join(labels)] += 1
+
+    def _worker_frames(self, frame) -> list:
+        stack = _thread_stack(frame)
+        for i, f in enumerate(stack):
+            # anyio workers call context.run(func) with the request's copied context
+            if "context" in f.f_code.co_varnames:
+                context = f.f_locals.get("context")
+                if isinstance(context, contextvars.Context) and context.get(_current_profile) is self:
+                    return [_label(inner.f_code) for inner in stack[i + 1:]]
+        return []
+
+    def folded(self) -> str:
+        """One "frame;frame;frame count" line per distinct stack (flamegraph.pl, speedscope)"""
+        samples = collections.Counter(dict(self.samples))   # the sampler may still be adding
+        return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+    def save(self, directory: str = PROFILE_DIR):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, self.name), "w") as f:
+            f.write(self.folded())
+        _prune(directory)
+
+
+class Sampler:
+    """
+    One background thread sampling every active request profile
+
+    It only runs while at least one profiled request is in progress.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self._active = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, profile: RequestProfile):
+        with self._lock:
+            self._active.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def stop(self, profile: RequestProfile):
+        with self._lock:
+            self._active.discard(profile)
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                active = list(self._active)
+                if not active:
+                    self._thread = None
+                    return
+            frames = sys._current_frames()
+            frames.pop(me, None)
+            for profile in active:
+                try:
+                    profile.sample(frames)
+                except Exception as e:   # a torn read of another thread's state; skip this sample
+                    logger.debug("Profile sample skipped: %s", e)
+            del frames
+            time.sleep(self.interval)
+
+
+sampler = Sampler()
+
+
+def _prune(directory: str, keep: int = PROFILE_MAX_FILES):
+    for name in list_profiles(directory)[keep:]:
+        os.remove(os.path.join(directory, name))
+
+
+def list_profiles(directory: str = PROFILE_DIR) -> list:
+    """Saved profile names, newest first"""
+    if not os.path.isdir(directory):
+        return []
+    names = [n for n in os.listdir(directory) if n.endswith(PROFILE_SUFFIX)]
+    return sorted(names, key=lambda n: os.path.getmtime(os.path.join(directory, n)), reverse=True)
+
+
+def read_profile(name: str, directory: str = PROFILE_DIR):
+    """Contents of a saved profile, or None if there is no such file"""
+    if os.path.basename(name) != name or not name.endswith(PROFILE_SUFFIX):
+        return None
+    path = os.path.join(directory, name)
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        return f.read()
+
+
+class RequestProfilerMiddleware:
+    """
+    ASGI middleware that profiles selected requests
+
+    Added inside log_requests so it runs in the same task as the endpoint.
+    The profile's file name is returned in the X-Profile response header;
+    the file is written once the request finishes.
+    """
+
+    def __init__(self, app, admin_token: str = "", sample_rate: float = PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.admin_token = admin_token.encode()
+        self.sample_rate = sample_rate
+
+    def _wanted(self, scope) -> bool:
+        headers = dict(scope["headers"])
+        if headers.get(b"x-profile") == b"1" and self.admin_token:
+            if hmac.compare_digest(headers.get(b"x-admin-token", b""), self.admin_token):
+                return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        header = (b"x-profile", profile.name.encode())
+
+        async def send_with_name(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), header]}
+            await send(message)
+
+        token = _current_profile.set(profile)
+        sampler.start(profile)
+        try:
+            await self.app(scope, receive, send_with_name)
+        finally:
+            sampler.stop(profile)
+            _current_profile.reset(token)
+            profile.duration = time.perf_counter() - profile.started
+            try:
+                await asyncio.to_thread(profile.save)
+                logger.info("Profiled %s %s (%.0f ms, %d samples): %s", profile.method, profile.path,
+                            profile.duration * 1000, sum(profile.samples.values()), profile.name)
+            except OSError as e:
+                logger.warning("Could not save profile %s: %s", profile.name, e)
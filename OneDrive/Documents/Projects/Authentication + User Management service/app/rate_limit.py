@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import Counter, Gauge
+
+# ============================================
+# LOGIN RATE LIMIT CONFIGURATION
+# ============================================
+LOGIN_RATE_LIMIT_ENABLED = os.getenv("LOGIN_RATE_LIMIT_ENABLED", "1") == "1"
+# Attempts allowed in a burst, and how many are refilled per minute
+LOGIN_LIMIT_USER_BURST = int(os.getenv("LOGIN_LIMIT_USER_BURST", "5"))
+LOGIN_LIMIT_USER_PER_MINUTE = float(os.getenv("LOGIN_LIMIT_USER_PER_MINUTE", "5"))
+LOGIN_LIMIT_IP_BURST = int(os.getenv("LOGIN_LIMIT_IP_BURST", "20"))
+LOGIN_LIMIT_IP_PER_MINUTE = float(os.getenv("LOGIN_LIMIT_IP_PER_MINUTE", "60"))
+# Upper bound on tracked keys per limiter (each entry is a few dozen bytes)
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+RATE_LIMITED = Counter("rate_limited_total", "Requests rejected by a rate limiter", ("limiter",))
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket per key, with bounded, self-expiring memory
+
+    Buckets live in an OrderedDict in last-used order. A bucket that has
+    been idle long enough to refill completely is the same as no bucket,
+    so those are dropped from the front as new requests arrive. If the
+    table still exceeds `max_keys`, the least recently used key is evicted.
+    """
+
+    def __init__(self, name: str, burst: int, per_minute: float, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        # A zero rate would lock a key out for good (and an infinite Retry-After)
+        if burst < 1 or per_minute <= 0:
+            raise ValueError(f"Rate limiter {name} needs a burst of at least 1 and a positive rate per minute")
+        self.name = name
+        self.capacity = float(burst)
+        self.rate = per_minute / 60.0
+        self.max_keys = max_keys
+        # Time for an empty bucket to refill completely
+        self.idle_expiry = self.capacity / self.rate
+        self._buckets = OrderedDict()   # key -> [tokens, last_update]
+        self._lock = threading.Lock()
+
+    def acquire(self, key) -> float:
+        """Take one token for `key`; returns 0 if allowed, else seconds until retry"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = self.capacity
+            else:
+                tokens = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+                self._buckets.move_to_end(key)
+
+            if tokens >= 1:
+                self._buckets[key] = [tokens - 1, now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+                return 0.0
+
+            self._buckets[key] = [tokens, now]
+            RATE_LIMITED.inc(self.name)
+            return (1 - tokens) / self.rate
+
+    def _expire(self, now: float):
+        # Oldest entries are at the front; stop at the first one still refilling
+        while self._buckets:
+            key, (tokens, last_update) = next(iter(self._buckets.items()))
+            if now - last_update < self.idle_expiry:
+                break
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+login_user_limiter = TokenBucketLimiter("login_user", LOGIN_LIMIT_USER_BURST, LOGIN_LIMIT_USER_PER_MINUTE)
+login_ip_limiter = TokenBucketLimiter("login_ip", LOGIN_LIMIT_IP_BURST, LOGIN_LIMIT_IP_PER_MINUTE)
+
+Gauge(
+    "rate_limit_tracked_keys", "Keys currently tracked by each rate limiter",
+    lambda: {("login_user",): len(login_user_limiter), ("login_ip",): len(login_ip_limiter)},
+    labels=("limiter",),
+)
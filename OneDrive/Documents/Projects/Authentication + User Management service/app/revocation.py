@@ -0,0 +1,110 @@
+import heapq
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import RevokedToken
+from .metrics import Gauge
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# REVOCATION CONFIGURATION
+# ============================================
+# How often revocations made by other workers are pulled from the database
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
+
+
+class RevocationIndex:
+    """
+    Set of revoked token ids (`jti`) that forgets them once they expire
+
+    Lookups are a dict membership test. A min-heap ordered by `exp` lets
+    expired entries be shed from the front without scanning: an expired
+    token is rejected by its `exp` anyway, so it no longer needs a slot.
+    """
+
+    def __init__(self):
+        self._expiry = {}   # jti -> exp
+        self._heap = []     # (exp, jti)
+        self._lock = threading.Lock()
+        self.last_id = 0    # highest revoked_tokens.id loaded
+
+    def revoke(self, jti: str, exp: int):
+        with self._lock:
+            if jti not in self._expiry:
+                self._expiry[jti] = exp
+                heapq.heappush(self._heap, (exp, jti))
+
+    def is_revoked(self, jti) -> bool:
+        if not self._expiry or jti is None:
+            return False
+        if self._heap and self._heap[0][0] <= time.time():
+            self._shed()
+        return jti in self._expiry
+
+    def _shed(self):
+        now = time.time()
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                exp, jti = heapq.heappop(self._heap)
+                self._expiry.pop(jti, None)
+
+    async def sync(self, db: AsyncSession):
+        """Load revocations recorded since the last sync and purge expired rows"""
+        result = await db.execute(
+            select(RevokedToken.id, RevokedToken.jti, RevokedToken.expires_at)
+            .where(RevokedToken.id > self.last_id)
+            .where(RevokedToken.expires_at > int(time.time()))
+            .order_by(RevokedToken.id)
+        )
+        for row_id, jti, exp in result.all():
+            self.revoke(jti, exp)
+            self.last_id = row_id
+        # The newest row always stays: without AUTOINCREMENT (tables created before
+        # it was declared) SQLite would otherwise reuse ids other workers have passed
+        newest = select(func.max(RevokedToken.id)).scalar_subquery()
+        await db.execute(
+            delete(RevokedToken)
+            .where(RevokedToken.expires_at <= int(time.time()))
+            .where(RevokedToken.id < newest)
+        )
+        await db.commit()
+
+    def __len__(self):
+        return len(self._expiry)
+
+
+revocation_index = RevocationIndex()
+
+
+async def revoke_token(db: AsyncSession, payload: dict) -> bool:
+    """
+    Record a token's revocation in the database and the in-memory index
+
+    Returns False if the token was already revoked. The unique `jti` column
+    makes this atomic across workers, so a refresh token can be spent once.
+    """
+    jti, exp = payload.get("jti"), int(payload.get("exp", 0))
+    if jti is None:
+        raise ValueError("Token has no jti and cannot be revoked")
+    if revocation_index.is_revoked(jti):
+        return False
+    db.add(RevokedToken(jti=jti, expires_at=exp))
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        revocation_index.revoke(jti, exp)
+        return False
+    revocation_index.revoke(jti, exp)
+    logger.info("Revoked token %s for %s", jti, payload.get("sub"))
+    return True
+
+
+Gauge("revoked_tokens", "Unexpired revoked tokens held in memory", lambda: len(revocation_index))
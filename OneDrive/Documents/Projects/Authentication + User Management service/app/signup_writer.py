@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import os
+
+from sqlalchemy.dialects.sqlite import insert
+
+from .counters import increment_users
+from .database import AsyncShardSessionLocal, User, shard_for
+from .metrics import DB_COMMIT_SECONDS, Histogram
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# SIGNUP GROUP COMMIT CONFIGURATION
+# ============================================
+# Concurrent signups are written by one task per user shard, many rows per
+# transaction, so N signups cost one commit (and one fsync) instead of N.
+SIGNUP_GROUP_COMMIT = os.getenv("SIGNUP_GROUP_COMMIT", "1") == "1"
+SIGNUP_BATCH_MAX = int(os.getenv("SIGNUP_BATCH_MAX", "128"))
+# How long the writer waits for more signups after the first one arrives
+SIGNUP_BATCH_WINDOW_MS = float(os.getenv("SIGNUP_BATCH_WINDOW_MS", "2"))
+
+SIGNUP_BATCH_SIZE = Histogram(
+    "signup_batch_size", "Signups written per group commit", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+)
+
+
+class SignupWriter:
+    """
+    Group-commit writer for new users on one shard
+
+    submit() queues a row and waits; the writer task takes everything
+    queued within the batch window (up to `max_batch` rows), inserts it
+    with one INSERT ... ON CONFLICT DO NOTHING RETURNING in one transaction
+    and resolves each caller with its new id. Names that were already
+    taken come back without an id and resolve to None.
+    """
+
+    def __init__(self, session_factory, max_batch: int = SIGNUP_BATCH_MAX,
+                 window: float = SIGNUP_BATCH_WINDOW_MS / 1000):
+        self.session_factory = session_factory
+        self.max_batch = max(1, max_batch)
+        self.window = window
+        self._queue = None
+        self._task = None
+        self.batches = 0
+        self.rows = 0
+
+    async def submit(self, username: str, password_hash: str):
+        """Insert a user; returns the new id, or None if the username is taken"""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            # First use, or a new event loop (e.g. a second test client)
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+        future = loop.create_future()
+        self._queue.put_nowait((username, password_hash, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._write(batch)
+
+    async def _write(self, batch):
+        # The first of several signups for one name wins, as with separate commits
+        values, seen = [], set()
+        for username, password_hash, _ in batch:
+            if username not in seen:
+                seen.add(username)
+                values.append({"username": username, "password_hash": password_hash})
+        try:
+            async with self.session_factory() as db:
+                stmt = (
+                    insert(User).values(values)
+                    .on_conflict_do_nothing(index_elements=[User.username])
+                    .returning(User.id, User.username)
+                )
+                created = {username: user_id for user_id, username in (await db.execute(stmt)).all()}
+                if created:
+                    await db.execute(increment_users(len(created)))
+                with DB_COMMIT_SECONDS.time("create_user_batch"):
+                    await db.commit()
+        except asyncio.CancelledError:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Signup writer stopped"))
+            raise
+        except Exception as e:
+            logger.error("Signup batch of %d failed: %s", len(batch), e)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.rows += len(created)
+        SIGNUP_BATCH_SIZE.observe(len(batch))
+        for username, _, future in batch:
+            user_id = created.pop(username, None)
+            if not future.done():   # the caller may have gone away
+                future.set_result(user_id)
+
+    async def close(self):
+        """Stop the writer task; rows it has not picked up yet are failed"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._queue is not None and not self._queue.empty():
+            _, _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Signup writer stopped"))
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "rows_per_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+signup_writers = [SignupWriter(factory) for factory in AsyncShardSessionLocal]
+
+
+def signup_writer_for(username: str) -> SignupWriter:
+    """The writer for the shard `username` lives on"""
+    return signup_writers[shard_for(username)]
+
+
+async def close_signup_writers():
+    for writer in signup_writers:
+        await writer.close()
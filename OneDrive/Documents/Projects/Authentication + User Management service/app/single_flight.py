@@ -0,0 +1,67 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+
+from .metrics import Counter, Gauge
+
+# ============================================
+# LOGIN SINGLE-FLIGHT CONFIGURATION
+# ============================================
+# Identical logins arriving together (client retries, gateways fanning out)
+# share one lookup and one password check instead of paying for N.
+LOGIN_SINGLE_FLIGHT = os.getenv("LOGIN_SINGLE_FLIGHT", "1") == "1"
+
+SINGLE_FLIGHT_CALLS = Counter(
+    "login_single_flight_total", "Login verifications started (leader) or shared (joined)", ("role",)
+)
+
+# Per-process key, so in-flight keys never hold the password or a plain hash of it
+_KEY_SECRET = secrets.token_bytes(32)
+
+
+def login_flight_key(username: str, password: str) -> tuple:
+    """Key for one username/password pair, unusable outside this process"""
+    digest = hmac.new(_KEY_SECRET, password.encode(), hashlib.sha256).digest()
+    return username, digest
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one
+
+    The first caller starts func() as its own task; callers arriving while
+    it runs await the same task and get the same result or exception.
+    The key is dropped the moment the task finishes, so nothing is cached:
+    the next attempt runs func() again.
+    """
+
+    def __init__(self):
+        self._flights = {}
+
+    async def run(self, key, func):
+        task = self._flights.get(key)
+        if task is None:
+            # A separate task, so a leader that disconnects doesn't cancel the others
+            task = asyncio.ensure_future(func())
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            SINGLE_FLIGHT_CALLS.inc("leader")
+        else:
+            SINGLE_FLIGHT_CALLS.inc("joined")
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        if not task.cancelled():
+            task.exception()   # retrieved, even if every caller went away
+
+    def __len__(self):
+        return len(self._flights)
+
+
+login_flights = SingleFlight()
+
+Gauge("login_single_flight_in_flight", "Distinct login verifications in progress", lambda: len(login_flights))
@@ -0,0 +1,87 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import Gauge
+
+# ============================================
+# TOKEN CACHE CONFIGURATION
+# ============================================
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of already-verified JWT payloads
+
+    Keys are SHA-256 digests of the raw token, so a tampered token never
+    matches a cached entry. Entries are dropped once their `exp` passes.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str):
+        """Return the cached payload, or None if missing or expired"""
+        if self.max_size <= 0:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            payload, exp = entry
+            if exp is not None and time.time() >= exp:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return dict(payload)
+
+    def put(self, token: str, payload: dict):
+        """Remember a payload that has just been verified"""
+        if self.max_size <= 0:
+            return
+        key = self._key(token)
+        exp = payload.get("exp")
+        with self._lock:
+            self._entries[key] = (dict(payload), exp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired_evictions": self.expired,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+token_cache = TokenCache()
+
+Gauge("token_cache_size", "Verified tokens currently cached", lambda: len(token_cache._entries))
+Gauge("token_cache_hits_total", "Token cache hits", lambda: token_cache.hits, kind="counter")
+Gauge("token_cache_misses_total", "Token cache misses", lambda: token_cache.misses, kind="counter")
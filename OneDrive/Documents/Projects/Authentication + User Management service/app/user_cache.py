@@ -0,0 +1,90 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import Gauge
+
+# ============================================
+# USER CACHE CONFIGURATION
+# ============================================
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+# Bounds how long another worker's password change can go unnoticed here
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+
+
+class UserRecordCache:
+    """
+    Bounded LRU cache of username -> (id, password_hash) for logins
+
+    Only existing users are cached (unknown names are answered by the
+    username filter). Entries expire after `ttl` seconds and are dropped
+    as soon as this process changes the row.
+    """
+
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()   # username -> (id, password_hash, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    def get(self, username: str):
+        """Return (id, password_hash), or None if missing or expired"""
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is None:
+                self.misses += 1
+                return None
+            if time.monotonic() >= entry[2]:
+                del self._entries[username]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(username)
+            self.hits += 1
+        return entry[0], entry[1]
+
+    def put(self, username: str, user_id: int, password_hash: str):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[username] = (user_id, password_hash, time.monotonic() + self.ttl)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, username: str):
+        """Forget a user whose row just changed"""
+        with self._lock:
+            if self._entries.pop(username, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired_evictions": self.expired,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+user_cache = UserRecordCache()
+
+Gauge("user_cache_size", "User records currently cached", lambda: len(user_cache._entries))
+Gauge("user_cache_hits_total", "User cache hits", lambda: user_cache.hits, kind="counter")
+Gauge("user_cache_misses_total", "User cache misses", lambda: user_cache.misses, kind="counter")
@@ -0,0 +1,74 @@
+import heapq
+import itertools
+import json
+import sys
+
+from sqlalchemy import select
+
+from .database import User
+
+# ============================================
+# USER LISTING
+# ============================================
+# Pages are keyset-paginated on the unique, indexed username: each page
+# starts with `username > last seen`, so page 10,000 costs the same index
+# seek as page 1 (no OFFSET scan). Usernames, unlike ids, are unique
+# across user shards, so one cursor works for every shard.
+USER_PAGE_SIZE = 100
+USER_PAGE_MAX = 1000
+
+
+def prefix_upper_bound(prefix: str):
+    """
+    Smallest string greater than every string starting with `prefix`
+
+    None when there is none (the prefix is all U+10FFFF): no upper bound.
+    """
+    stripped = prefix.rstrip(chr(sys.maxunicode))
+    if not stripped:
+        return None
+    next_char = ord(stripped[-1]) + 1
+    if 0xD800 <= next_char <= 0xDFFF:
+        next_char = 0xE000   # surrogates can't be stored; UTF-8 order skips them too
+    return stripped[:-1] + chr(next_char)
+
+
+def _page_query(after, prefix, limit: int):
+    query = select(User.username, User.id).order_by(User.username).limit(limit)
+    if after is not None:
+        query = query.where(User.username > after)
+    if prefix:
+        # A range on the username index rather than LIKE, which SQLite
+        # can't serve from an index without case_sensitive_like
+        query = query.where(User.username >= prefix)
+        upper = prefix_upper_bound(prefix)
+        if upper is not None:
+            query = query.where(User.username < upper)
+    return query
+
+
+async def list_users_page(dbs, after=None, prefix=None, limit: int = USER_PAGE_SIZE):
+    """
+    One page of users ordered by username, across every shard in `dbs`
+
+    Returns (rows, next_after): rows are (username, id) tuples and
+    next_after is the cursor for the next page, or None on the last one.
+    """
+    query = _page_query(after, prefix, limit + 1)
+    shard_rows = [(await db.execute(query)).all() for db in dbs]
+    rows = list(itertools.islice(heapq.merge(*shard_rows), limit + 1))
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1][0]
+    return rows, None
+
+
+async def iter_users_ndjson(dbs, prefix=None, page_size: int = USER_PAGE_MAX):
+    """Every matching user as NDJSON lines, one page in memory at a time"""
+    after = None
+    while True:
+        rows, after = await list_users_page(dbs, after, prefix, page_size)
+        if rows:
+            yield "".join(json.dumps({"id": user_id, "username": username}) + "\n"
+                          for username, user_id in rows)
+        if after is None:
+            break
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import logging
+import math
+import os
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .database import User, async_shard_sessions, shard_for
+from .metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# USERNAME FILTER CONFIGURATION
+# ============================================
+USERNAME_FILTER_ENABLED = os.getenv("USERNAME_FILTER_ENABLED", "1") == "1"
+USERNAME_FILTER_CAPACITY = int(os.getenv("USERNAME_FILTER_CAPACITY", "1000000"))
+USERNAME_FILTER_FP_RATE = float(os.getenv("USERNAME_FILTER_FP_RATE", "0.01"))
+# How often rows added by other workers/tools are pulled in
+USERNAME_FILTER_REFRESH_SECONDS = float(os.getenv("USERNAME_FILTER_REFRESH_SECONDS", "5"))
+LOAD_BATCH_SIZE = 10000
+
+FILTER_LOOKUPS = Counter(
+    "username_filter_lookups_total", "Username filter answers", ("result",)
+)
+
+
+class BloomFilter:
+    """
+    Bloom filter over strings
+
+    Sized for `capacity` items at `fp_rate`; k bit positions come from
+    double hashing one 128-bit BLAKE2b digest.
+    """
+
+    def __init__(self, capacity: int, fp_rate: float):
+        self.capacity = max(1, capacity)
+        self.fp_rate = fp_rate
+        self.num_bits = max(8, int(-self.capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def estimated_fp_rate(self) -> float:
+        fill = 1 - math.exp(-self.num_hashes * self.count / self.num_bits)
+        return fill ** self.num_hashes
+
+
+class UsernameIndex:
+    """
+    In-memory "definitely not registered" check for usernames
+
+    Built from the users table in the background at startup, updated on
+    signup, and topped up periodically with rows added elsewhere. Until the
+    first load finishes every username is reported as possibly present, so
+    callers fall back to the database. A "no" from might_exist() can be
+    stale by up to one refresh; might_exist_async() catches up first.
+    """
+
+    def __init__(self, capacity: int = USERNAME_FILTER_CAPACITY, fp_rate: float = USERNAME_FILTER_FP_RATE):
+        self.fp_rate = fp_rate
+        self.filter = BloomFilter(capacity, fp_rate)
+        self.ready = False
+        self.last_ids = {}  # shard -> highest users.id seen there
+        self._scans = {}    # shard -> scans started, to share one catch-up between misses
+        self._locks = {}    # shard -> asyncio.Lock around scans
+
+    def might_exist(self, username: str) -> bool:
+        if not (USERNAME_FILTER_ENABLED and self.ready):
+            return True
+        if username in self.filter:
+            FILTER_LOOKUPS.inc("maybe_present")
+            return True
+        FILTER_LOOKUPS.inc("absent")
+        return False
+
+    async def might_exist_async(self, db: AsyncSession, username: str) -> bool:
+        """
+        might_exist(), but a "no" is only final after catching up with the shard
+
+        Users created by other workers or tools reach the filter on the next
+        refresh; before answering "no", rows added since the last scan are
+        pulled in (usually none: one primary-key range query). Misses that
+        wait for the same scan share it.
+        """
+        if self.might_exist(username):
+            return True
+        shard = shard_for(username)
+        scans = self._scans.get(shard, 0)
+        async with self._lock(shard):
+            if self._scans.get(shard, 0) == scans:   # else a scan started after this miss has run
+                await self._scan_shard(db, shard)
+        if username in self.filter:
+            FILTER_LOOKUPS.inc("found_on_refresh")
+            return True
+        return False
+
+    def add(self, username: str):
+        # Skipping names already present keeps `count` close to the real
+        # number of users when signups are also picked up by refresh()
+        if username not in self.filter:
+            self.filter.add(username)
+
+    async def load(self):
+        """(Re)build the filter from scratch, growing it if the table outgrew it"""
+        capacity = self.filter.capacity
+        if self.needs_resize():
+            capacity = self.filter.count * 2
+        self.ready = False
+        while True:
+            self.filter = BloomFilter(capacity, self.fp_rate)
+            self.last_ids = {}
+            await self.refresh()
+            if self.filter.count <= capacity:
+                break
+            capacity = self.filter.count * 2
+        self.ready = True
+        logger.info("Username filter loaded: %d users, %d KiB",
+                    self.filter.count, len(self.filter.bits) // 1024)
+
+    async def refresh(self):
+        """Add users created since the last refresh, on every shard"""
+        async with async_shard_sessions(read_only=True) as sessions:
+            for shard, db in enumerate(sessions):
+                await self._refresh_shard(db, shard)
+
+    def _lock(self, shard: int) -> asyncio.Lock:
+        lock = self._locks.get(shard)
+        if lock is None:
+            lock = self._locks[shard] = asyncio.Lock()
+        return lock
+
+    async def _refresh_shard(self, db: AsyncSession, shard: int):
+        async with self._lock(shard):
+            await self._scan_shard(db, shard)
+
+    async def _scan_shard(self, db: AsyncSession, shard: int):
+        # Keyset scan on the primary key from the last id seen on this shard
+        self._scans[shard] = self._scans.get(shard, 0) + 1
+        while True:
+            result = await db.execute(
+                select(User.id, User.username)
+                .where(User.id > self.last_ids.get(shard, 0))
+                .order_by(User.id)
+                .limit(LOAD_BATCH_SIZE)
+            )
+            rows = result.all()
+            for user_id, username in rows:
+                self.add(username)
+            if rows:
+                self.last_ids[shard] = rows[-1][0]
+            if len(rows) < LOAD_BATCH_SIZE:
+                break
+
+    def needs_resize(self) -> bool:
+        return self.filter.count > self.filter.capacity
+
+    def stats(self) -> dict:
+        return {
+            "enabled": USERNAME_FILTER_ENABLED,
+            "ready": self.ready,
+            "items": self.filter.count,
+            "capacity": self.filter.capacity,
+            "target_fp_rate": self.fp_rate,
+            "estimated_fp_rate": round(self.filter.estimated_fp_rate(), 6),
+            "bits": self.filter.num_bits,
+            "hash_functions": self.filter.num_hashes,
+            "memory_bytes": len(self.filter.bits),
+        }
+
+
+username_index = UsernameIndex()
+
+Gauge("username_filter_items", "Usernames added to the filter", lambda: username_index.filter.count)
+Gauge("username_filter_memory_bytes", "Username filter bit array size", lambda: len(username_index.filter.bits))
@@ -0,0 +1,307 @@
+# bench_auth.py
+"""
+Benchmark / load test for /signup, /login and /protected
+
+Seeds a throwaway SQLite database with N users, then drives the API either
+in-process (httpx + ASGI, no network) or through a local uvicorn server,
+and reports throughput and p50/p95/p99 latency per route. Results are
+saved as JSON so runs on different commits can be compared.
+
+Examples (run from the project directory):
+    python benchmarks/bench_auth.py --users 10000
+    python benchmarks/bench_auth.py --users 1000000 --mode uvicorn --concurrency 64
+    python benchmarks/bench_auth.py --compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+
+import httpx
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(PROJECT_DIR, "benchmarks", "results")
+ROUTES = ("signup", "login", "protected")
+BENCH_PASSWORD = "Bench123!"
+
+
+# ============================================
+# SEEDING
+# ============================================
+def seed_database(workdir: str, users: int, batch_size: int = 50000):
+    """
+    Create `users` rows sharing one precomputed hash in workdir's users.db
+    (or the user shard files when USER_SHARDS is set)
+
+    Hashing once keeps seeding a million users down to seconds; logins
+    still pay a full password check per request. The hash comes from the
+    configured hasher (PASSWORD_HASHER, BCRYPT_ROUNDS, ...), so logins
+    measure steady state rather than rehash-on-login writes.
+    """
+    # Mirrors app.database.shard_for; importing app.database here would pin
+    # its engines to the current directory instead of workdir
+    shards = max(1, int(os.environ.get("USER_SHARDS", "1")))
+    shard_file = os.environ.get("USER_SHARD_FILE", "./users_shard{}.db")
+    shard_files = ["users.db"] if shards == 1 else [shard_file.format(i) for i in range(shards)]
+
+    def shard_for(username: str) -> int:
+        return zlib.crc32(username.encode()) % shards
+
+    # app.hashing doesn't touch the database, so it is safe to import here
+    sys.path.insert(0, PROJECT_DIR)
+    from app.hashing import hash_password
+
+    password_hash = hash_password(BENCH_PASSWORD)
+    conns = [sqlite3.connect(os.path.join(workdir, path)) for path in shard_files]
+    for conn in conns:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "id INTEGER PRIMARY KEY, username VARCHAR NOT NULL, password_hash VARCHAR NOT NULL)"
+        )
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_users_username ON users (username)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)")
+    for start in range(0, users, batch_size):
+        stop = min(start + batch_size, users)
+        for i in range(start, stop):
+            username = f"seed{i}"
+            conns[shard_for(username)].execute(
+                "INSERT INTO users (username, password_hash) VALUES (?, ?)", (username, password_hash)
+            )
+        for conn in conns:
+            conn.commit()
+    for conn in conns:
+        conn.close()
+
+
+# ============================================
+# CLIENTS
+# ============================================
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Quiet logs, no login rate limit (all load comes from one IP), and the
+# tables the seed step doesn't create
+BENCH_DEFAULTS = {"LOG_LEVEL": "WARNING", "LOGIN_RATE_LIMIT_ENABLED": "0", "CREATE_TABLES": "1"}
+
+
+def _bench_env() -> dict:
+    env = dict(os.environ)
+    for key, value in BENCH_DEFAULTS.items():
+        env.setdefault(key, value)
+    env["PYTHONPATH"] = PROJECT_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+async def start_uvicorn(workdir: str):
+    """Start `uvicorn main:app` on a free port and wait until it answers"""
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=_bench_env(),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    async with httpx.AsyncClient(base_url=base_url) as probe:
+        for _ in range(300):
+            try:
+                await probe.get("/")
+                return server, base_url
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    server.kill()
+    raise RuntimeError("uvicorn did not start")
+
+
+def in_process_client(workdir: str):
+    """httpx client calling the ASGI app directly (database in `workdir`)"""
+    os.chdir(workdir)
+    for key, value in BENCH_DEFAULTS.items():
+        os.environ.setdefault(key, value)
+    sys.path.insert(0, PROJECT_DIR)
+    import main
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench")
+    # ASGITransport sends no lifespan events, so startup/shutdown run here
+    return client, main.app.router.lifespan_context(main.app)
+
+
+# ============================================
+# LOAD GENERATION
+# ============================================
+def percentile(sorted_values, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def drive(client, make_request, requests: int, concurrency: int) -> dict:
+    """Send `requests` requests with `concurrency` workers; returns latency stats in ms"""
+    latencies, errors, counter = [], 0, iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            response = await make_request(client, i)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+    }
+
+
+async def run_benchmark(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="auth-bench-")
+    print(f"🔄 Seeding {args.users} users in {workdir}...")
+    seed_started = time.perf_counter()
+    seed_database(workdir, args.users)
+    print(f"✅ Seeded in {time.perf_counter() - seed_started:.1f}s")
+
+    server = lifespan = None
+    if args.mode == "uvicorn":
+        server, base_url = await start_uvicorn(workdir)
+        client = httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        client, lifespan = in_process_client(workdir)
+        await lifespan.__aenter__()
+
+    new_user_ids = itertools.count()  # warm-up and measured signups never collide
+    scenarios = {
+        "signup": lambda c, i: c.post("/signup", json={"username": f"new{next(new_user_ids)}", "password": BENCH_PASSWORD}),
+        "login": lambda c, i: c.post("/login", json={"username": f"seed{i % max(args.users, 1)}", "password": BENCH_PASSWORD}),
+    }
+
+    results = {}
+    try:
+        async with client:
+            if "protected" in args.routes:
+                if args.users == 0:
+                    raise SystemExit("--users must be at least 1 to benchmark /protected")
+                login = await client.post("/login", json={"username": "seed0", "password": BENCH_PASSWORD})
+                headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+                scenarios["protected"] = lambda c, i: c.get("/protected", headers=headers)
+
+            for route in args.routes:
+                requests = args.requests if route == "protected" else args.hash_requests
+                print(f"🚀 {route}: {requests} requests, concurrency {args.concurrency}")
+                await drive(client, scenarios[route], min(requests, args.concurrency), args.concurrency)  # warm-up
+                results[route] = await drive(client, scenarios[route], requests, args.concurrency)
+                print(f"   {results[route]}")
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "mode": args.mode,
+        "users": args.users,
+        "user_shards": int(os.environ.get("USER_SHARDS", "1")),
+        "concurrency": args.concurrency,
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+# ============================================
+# RESULTS
+# ============================================
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(report: dict, output_dir: str) -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    name = f"{report['commit']}-{report['mode']}-{report['users']}users-{int(time.time())}.json"
+    path = os.path.join(output_dir, name)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+
+def compare(baseline_path: str, candidate_path: str):
+    """Print per-route changes between two saved runs"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    print(f"Baseline:  {baseline['commit']} ({baseline['mode']}, {baseline['users']} users)")
+    print(f"Candidate: {candidate['commit']} ({candidate['mode']}, {candidate['users']} users)")
+    for route, new in candidate["results"].items():
+        old = baseline["results"].get(route)
+        if not old:
+            continue
+        print(f"\n{route}:")
+        for metric in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+            change = (new[metric] - old[metric]) / old[metric] * 100 if old[metric] else 0.0
+            print(f"   {metric:15} {old[metric]:>10} -> {new[metric]:>10}  ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark signup, login and protected routes")
+    parser.add_argument("--users", type=int, default=10000, help="users to seed before the run")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--routes", default=",".join(ROUTES), help="comma-separated subset of signup,login,protected")
+    parser.add_argument("--requests", type=int, default=5000, help="requests for /protected")
+    parser.add_argument("--hash-requests", type=int, default=200, help="requests for /signup and /login (bcrypt bound)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--output", default=RESULTS_DIR, help="directory for the JSON result")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="compare two saved results")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    args.routes = [r.strip() for r in args.routes.split(",") if r.strip()]
+    unknown = set(args.routes) - set(ROUTES)
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(sorted(unknown))}")
+
+    report = asyncio.run(run_benchmark(args))
+    print(f"\n📁 Results saved to {save_results(report, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
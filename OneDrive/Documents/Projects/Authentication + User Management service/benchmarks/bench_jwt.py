@@ -0,0 +1,134 @@
+# bench_jwt.py
+"""
+Microbenchmark: PyJWT vs the precomputed HS256 codec (app/jwt_codec.py)
+
+First checks that both produce identical tokens and payloads (and that
+the codec hands tampered or unusual tokens back to PyJWT), then times
+encode and decode of a typical access token with each.
+
+Examples (run from the project directory):
+    python benchmarks/bench_jwt.py
+    python benchmarks/bench_jwt.py --iterations 200000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+import jwt
+
+from bench_auth import PROJECT_DIR, RESULTS_DIR, git_commit
+
+sys.path.insert(0, PROJECT_DIR)
+from app.jwt_codec import HS256Codec  # noqa: E402
+
+SECRET = "bench-secret-key-that-is-long-enough-for-hs256"
+
+
+def sample_payloads():
+    exp = int(time.time()) + 1800
+    return [
+        {"sub": "alice", "exp": exp, "type": "access", "jti": "n2Qx7V0rKk1mJ3cQ9pZ4aw"},
+        {"sub": "Zoë ünïcode 用户", "exp": exp, "type": "refresh", "jti": "x"},
+        {"sub": "bob", "exp": datetime.utcnow() + timedelta(minutes=5), "roles": ["admin", "ops"]},
+        {"sub": "carol", "exp": exp, "iat": exp - 60, "nbf": exp - 60},
+        {"sub": "dave", "exp": exp, "nested": {"a": 1, "b": [1.5, None, True]}},
+    ]
+
+
+def check_compatibility(codec: HS256Codec) -> int:
+    """Assert byte-for-byte parity with PyJWT; returns the number of checks"""
+    checks = 0
+    for payload in sample_payloads():
+        expected = jwt.encode(payload, SECRET, algorithm="HS256")
+        token = codec.encode(payload)
+        assert token == expected, f"encode differs for {payload}:\n{token}\n{expected}"
+        decoded = codec.decode(token)
+        if decoded is not None:   # None = left to PyJWT (e.g. iat/nbf present)
+            assert decoded == jwt.decode(token, SECRET, algorithms=["HS256"])
+        checks += 1
+
+    token = codec.encode(sample_payloads()[0])
+    header, body, signature = token.split(".")
+    tampered = [
+        f"{header}.{body}.{signature[:-2]}AA",
+        f"{header}.{body[:-2]}xx.{signature}",
+        f"{header}.{body}",
+        jwt.encode(sample_payloads()[0], "another-secret-key-that-is-long-enough", algorithm="HS256"),
+    ]
+    for bad in tampered:
+        assert codec.decode(bad) is None, f"codec accepted {bad}"
+        checks += 1
+
+    expired = codec.encode({"sub": "eve", "exp": int(time.time()) - 1})
+    for decode in (codec.decode, lambda t: jwt.decode(t, SECRET, algorithms=["HS256"])):
+        try:
+            decode(expired)
+            raise AssertionError("expired token accepted")
+        except jwt.ExpiredSignatureError:
+            checks += 1
+    return checks
+
+
+def ops_per_second(func, iterations: int) -> float:
+    func()   # warm up
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return iterations / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PyJWT and the HS256 fast codec")
+    parser.add_argument("--iterations", type=int, default=50000)
+    parser.add_argument("--output", default=RESULTS_DIR, help="directory for the JSON result")
+    args = parser.parse_args()
+
+    codec = HS256Codec(SECRET)
+    print(f"✅ {check_compatibility(codec)} compatibility checks passed")
+
+    payload = sample_payloads()[0]
+    token = codec.encode(payload)
+    timings = {
+        "encode": {
+            "pyjwt": ops_per_second(lambda: jwt.encode(payload, SECRET, algorithm="HS256"), args.iterations),
+            "fast": ops_per_second(lambda: codec.encode(payload), args.iterations),
+        },
+        "decode": {
+            "pyjwt": ops_per_second(lambda: jwt.decode(token, SECRET, algorithms=["HS256"]), args.iterations),
+            "fast": ops_per_second(lambda: codec.decode(token), args.iterations),
+        },
+    }
+
+    results = {}
+    for operation, ops in timings.items():
+        speedup = ops["fast"] / ops["pyjwt"]
+        results[operation] = {
+            "pyjwt_ops_per_sec": round(ops["pyjwt"]),
+            "fast_ops_per_sec": round(ops["fast"]),
+            "pyjwt_us": round(1e6 / ops["pyjwt"], 2),
+            "fast_us": round(1e6 / ops["fast"], 2),
+            "speedup": round(speedup, 2),
+        }
+        print(f"{operation:7} PyJWT {1e6 / ops['pyjwt']:6.2f} µs   fast {1e6 / ops['fast']:6.2f} µs   "
+              f"{speedup:.1f}x")
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "mode": "jwt",
+        "iterations": args.iterations,
+        "pyjwt_version": jwt.__version__,
+        "results": results,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{report['commit']}-jwt-{int(time.time())}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📁 Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# bench_startup.py
+"""
+Cold-start benchmark: time from launching a worker to its first answer
+
+Each run starts a fresh interpreter, so nothing is cached between runs.
+Two numbers are reported per run:
+    import_ms         `import main` alone (module-level work)
+    first_request_ms  process launch -> first successful response from
+                      `uvicorn main:app` (import + lifespan + first request)
+
+Examples (run from the project directory):
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 20 --path /users/count
+    STARTUP_PREWARM=0 python benchmarks/bench_startup.py
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+from bench_auth import (
+    RESULTS_DIR, _bench_env, _free_port, git_commit, percentile, seed_database,
+)
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import main; "
+    "print((time.perf_counter() - started) * 1000)"
+)
+
+
+def time_import(workdir: str) -> float:
+    """Milliseconds spent importing main in a new interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=workdir, env=_bench_env(), capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def time_first_request(workdir: str, path: str, timeout: float = 60.0) -> float:
+    """Milliseconds from starting uvicorn to the first 2xx response on `path`"""
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=_bench_env(),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            while time.perf_counter() - started < timeout:
+                try:
+                    if client.get(path).is_success:
+                        return (time.perf_counter() - started) * 1000
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+        raise RuntimeError(f"no successful response from {path} within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summarize(values: list) -> dict:
+    values = sorted(values)
+    return {
+        "runs": len(values),
+        "min_ms": round(values[0], 1),
+        "p50_ms": round(statistics.median(values), 1),
+        "p95_ms": round(percentile(values, 95), 1),
+        "max_ms": round(values[-1], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and time-to-first-request")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--users", type=int, default=1000, help="users to seed before the runs")
+    parser.add_argument("--path", default="/", help="route requested as the first request")
+    parser.add_argument("--output", default=RESULTS_DIR, help="directory for the JSON result")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="auth-startup-")
+    seed_database(workdir, args.users)
+    # One throwaway start creates the remaining tables; the measured runs
+    # then skip schema creation unless CREATE_TABLES is set explicitly
+    time_first_request(workdir, args.path)
+    os.environ.setdefault("CREATE_TABLES", "0")
+
+    imports, first_requests = [], []
+    print(f"🚀 {args.runs} cold starts, first request GET {args.path}")
+    for run in range(args.runs):
+        imports.append(time_import(workdir))
+        first_requests.append(time_first_request(workdir, args.path))
+        print(f"   run {run + 1}: import {imports[-1]:.0f} ms, first request {first_requests[-1]:.0f} ms")
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "mode": "startup",
+        "users": args.users,
+        "path": args.path,
+        "settings": {key: os.environ[key] for key in ("CREATE_TABLES", "STARTUP_PREWARM") if key in os.environ},
+        "results": {"import": summarize(imports), "first_request": summarize(first_requests)},
+    }
+    for name, stats in report["results"].items():
+        print(f"{name:14} {stats}")
+
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, f"{report['commit']}-startup-{int(time.time())}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📁 Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# build_breached_index.py
+"""
+Compile a breached-password list into the binary index used at signup
+
+Examples:
+    python build_breached_index.py rockyou.txt --output breached.idx
+    python build_breached_index.py pwned-passwords-sha1-ordered-by-hash.txt --format sha1 --width 10
+
+--format plain reads one password per line; --format sha1 reads
+"HEX[:count]" lines (the Have I Been Pwned download). Then start the
+service with BREACHED_PASSWORDS_FILE=breached.idx.
+
+Input is spilled into 256 files by first digest byte and each is sorted on
+its own. Sorting holds one Python bytes object per entry, so peak memory
+is about 4-7 times the largest spill file (roughly 1/256th of the input
+digests): a few hundred MB for the full Have I Been Pwned list.
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+
+from app.breached import MAX_WIDTH, MIN_WIDTH, write_index
+
+SPILL_FILES = 256
+
+
+def read_digests(paths, fmt: str, stats: dict):
+    for path in paths:
+        with open(path, "rb") as source:
+            for line in source:
+                line = line.rstrip(b"\r\n")
+                if not line:
+                    continue
+                if fmt == "plain":
+                    # SHA-1 of the raw bytes: password_digest() for UTF-8 lines, and
+                    # lists in other encodings (rockyou is mostly Latin-1) still build
+                    yield hashlib.sha1(line).digest()
+                    continue
+                try:
+                    digest = bytes.fromhex(line.split(b":", 1)[0].decode("ascii"))
+                except ValueError:
+                    digest = b""
+                if len(digest) != MAX_WIDTH:
+                    stats["skipped"] += 1
+                    continue
+                yield digest
+
+
+def spill(digests, directory: str, width: int) -> list:
+    """Split digests into SPILL_FILES files by their first byte"""
+    paths = [os.path.join(directory, f"{i:02x}.bin") for i in range(SPILL_FILES)]
+    files = [open(path, "wb", buffering=1 << 20) for path in paths]
+    try:
+        for digest in digests:
+            files[digest[0]].write(digest[:width])
+    finally:
+        for f in files:
+            f.close()
+    return paths
+
+
+def sorted_unique(paths: list, width: int):
+    """Yield every digest in order, sorting one spill file at a time"""
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.remove(path)
+        # A sorted list then one pass for duplicates: about half the memory of a set
+        entries = [data[i:i + width] for i in range(0, len(data), width)]
+        del data
+        entries.sort()
+        previous = None
+        for entry in entries:
+            if entry != previous:
+                yield entry
+                previous = entry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the breached password index")
+    parser.add_argument("sources", nargs="+", help="password or SHA-1 lists")
+    parser.add_argument("--format", choices=["plain", "sha1"], default="plain")
+    parser.add_argument("--output", default="breached.idx")
+    parser.add_argument("--width", type=int, default=MAX_WIDTH,
+                        help=f"bytes of SHA-1 kept per entry ({MIN_WIDTH}-{MAX_WIDTH}); "
+                             "10 halves the file with negligible false positives")
+    parser.add_argument("--tmp-dir", help="where to spill while sorting (defaults to the output directory)")
+    args = parser.parse_args()
+    if not MIN_WIDTH <= args.width <= MAX_WIDTH:
+        parser.error(f"--width must be between {MIN_WIDTH} and {MAX_WIDTH}")
+
+    started = time.perf_counter()
+    stats = {"skipped": 0}
+    tmp_dir = args.tmp_dir or os.path.dirname(os.path.abspath(args.output))
+    print(f"🔄 Reading {', '.join(args.sources)}...")
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as spill_dir:
+        paths = spill(read_digests(args.sources, args.format, stats), spill_dir, args.width)
+        print("🔄 Sorting...")
+        partial = args.output + ".tmp"
+        count = write_index(partial, sorted_unique(paths, args.width), args.width)
+    # Swap in atomically so running workers never map a half-written file
+    os.replace(partial, args.output)
+
+    size_mb = os.path.getsize(args.output) / 1e6
+    print(f"✅ {count} unique entries written to {args.output} ({size_mb:.1f} MB) "
+          f"in {time.perf_counter() - started:.1f}s")
+    if stats["skipped"]:
+        print(f"   Skipped {stats['skipped']} malformed lines")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# calibrate_hasher.py
+"""
+Pick password hashing parameters for a target latency on this machine
+
+Examples:
+    python calibrate_hasher.py --target-ms 250
+    python calibrate_hasher.py --hasher argon2id --target-ms 100 --memory-kib 65536
+
+Prints the environment variables to set. Users whose stored hash uses
+different parameters are re-hashed automatically on their next login.
+"""
+import argparse
+import statistics
+import time
+
+from app.hashing import BcryptHasher, Argon2Hasher
+
+SAMPLE_PASSWORD = "Calibrate123!"
+
+
+def measure_ms(hasher, samples: int) -> float:
+    """Median time to verify one password, which is what every login pays"""
+    password_hash = hasher.hash(SAMPLE_PASSWORD)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        hasher.verify(SAMPLE_PASSWORD, password_hash)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate_bcrypt(target_ms: float, samples: int):
+    """Highest cost within the target, or None if even the lowest misses it"""
+    best = None
+    # Each extra round doubles the cost; 10 is the lowest sensible value
+    for rounds in range(10, 20):
+        elapsed = measure_ms(BcryptHasher(rounds), samples)
+        print(f"   rounds={rounds}: {elapsed:.1f} ms")
+        if elapsed > target_ms:
+            break
+        best = {"BCRYPT_ROUNDS": rounds}
+    return best
+
+
+def calibrate_argon2(target_ms: float, samples: int, memory_kib: int, parallelism: int):
+    """Highest time cost within the target, or None if even the lowest misses it"""
+    best = None
+    # Memory cost is fixed (it bounds RAM per concurrent login); raise passes until the target
+    for time_cost in range(1, 21):
+        elapsed = measure_ms(Argon2Hasher(time_cost, memory_kib, parallelism), samples)
+        print(f"   time_cost={time_cost}: {elapsed:.1f} ms")
+        if elapsed > target_ms:
+            break
+        best = {"ARGON2_TIME_COST": time_cost}
+    if best is not None:
+        best.update({"ARGON2_MEMORY_COST": memory_kib, "ARGON2_PARALLELISM": parallelism})
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate password hash cost for a target latency")
+    parser.add_argument("--hasher", choices=["bcrypt", "argon2id"], default="bcrypt")
+    parser.add_argument("--target-ms", type=float, default=250.0,
+                        help="highest acceptable time for one password check")
+    parser.add_argument("--samples", type=int, default=3)
+    parser.add_argument("--memory-kib", type=int, default=65536, help="argon2id memory cost")
+    parser.add_argument("--parallelism", type=int, default=4, help="argon2id lanes")
+    args = parser.parse_args()
+
+    print(f"🔄 Calibrating {args.hasher} for <= {args.target_ms:.0f} ms per check...")
+    if args.hasher == "bcrypt":
+        settings = calibrate_bcrypt(args.target_ms, args.samples)
+    else:
+        settings = calibrate_argon2(args.target_ms, args.samples, args.memory_kib, args.parallelism)
+
+    if settings is None:
+        hint = "raise --target-ms" if args.hasher == "bcrypt" else "raise --target-ms or lower --memory-kib"
+        print(f"\n❌ Even the lowest setting takes longer than {args.target_ms:.0f} ms here; {hint}")
+        raise SystemExit(1)
+
+    print("\n✅ Suggested settings:")
+    print(f"   PASSWORD_HASHER={args.hasher}")
+    for key, value in settings.items():
+        print(f"   {key}={value}")
+
+
+if __name__ == "__main__":
+    main()
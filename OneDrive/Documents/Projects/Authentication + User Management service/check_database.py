@@ -47,9 +47,8 @@ if os.path.exists(db_file):
             # List all users
             if user_count > 0:
                 cursor.execute("SELECT id, username FROM users")
-                users = cursor.fetchall()
                 print("\n4. Registered users:")
-                for user in users:
+                for user in cursor:  # one row at a time, not the whole table
                     print(f"   ID: {user[0]}, Username: {user[1]}")
             else:
                 print("\n4. ❌ No users in the database!")
@@ -1,42 +1,161 @@
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, HTTPException, Depends, Request
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, HTTPException, Depends, Request, Header, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.auth_service import (
-    create_user,
-    authenticate_user,
+    create_user_async,
+    authenticate_login_async,
     create_access_token,
+    create_refresh_token,
     decode_access_token,
+    decode_refresh_token,
+    decode_any_token,
+    verify_access_tokens,
     UserAlreadyExists,
     WeakPassword,
+    BreachedPassword,
     InvalidCredentials,
     SECRET_KEY,
     ALGORITHM
 )
-from app.models import SignupRequest, LoginRequest
-from app.database import get_db, create_tables
+from app.models import SignupRequest, LoginRequest, RefreshRequest, RevokeRequest, VerifyBatchRequest
+from app.breached import get_breached_index
+from app.keys import JWT_ALGORITHM, get_keyring, log_legacy_hs256
+from app.revocation import REVOCATION_SYNC_SECONDS, revocation_index, revoke_token
+from app.database import (
+    USER_SHARDS,
+    get_db,
+    create_tables,
+    upgrade_tables,
+    async_engines,
+    AsyncSessionLocal,
+    async_shard_sessions,
+    dispose_engines,
+    shard_files,
+    sqlite_settings,
+    user_session,
+)
+from app.counters import (
+    USER_COUNT_RECONCILE_SECONDS,
+    count_all_users_async,
+    reconcile_all_user_counts_async,
+)
+from app.bulk import BULK_FORMATS, BULK_MAX_REPORTED_ERRORS, aiter_lines, import_users_async, export_users_async
+from app.admission import Overloaded
+from app.hashing import hash_admission, hash_pool, dummy_hash_async
+from app.metrics import HTTP_REQUEST_SECONDS, render_metrics
+from app.username_filter import username_index, USERNAME_FILTER_ENABLED, USERNAME_FILTER_REFRESH_SECONDS
+from app.rate_limit import LOGIN_RATE_LIMIT_ENABLED, login_user_limiter, login_ip_limiter
+from app.logging_config import setup_logging, stop_logging, current_route
+from app.profiling import PROFILE_ENABLED, RequestProfilerMiddleware, list_profiles, read_profile
+from app.token_cache import token_cache
+from app.user_cache import user_cache
+from app.signup_writer import SIGNUP_GROUP_COMMIT, close_signup_writers, signup_writers
+from app.user_listing import USER_PAGE_MAX, USER_PAGE_SIZE, iter_users_ndjson, list_users_page
+import asyncio
+import hmac
 import logging
+import math
+import os
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
+from typing import Optional
 import jwt
 
+logger = logging.getLogger(__name__)
+
 # ============================================
-# INITIALIZE DATABASE
+# BACKGROUND JOBS
 # ============================================
-create_tables()  # Creates database tables on startup
+async def reconcile_user_count_loop():
+    """Periodically recount users to correct any drift in the counter"""
+    while True:
+        await asyncio.sleep(USER_COUNT_RECONCILE_SECONDS)
+        try:
+            await reconcile_all_user_counts_async()
+        except Exception as e:
+            logger.error("User count reconcile failed: %s", e)
+
+async def username_filter_loop():
+    """Build the username filter, then keep adding users created elsewhere"""
+    await username_index.load()
+    while True:
+        await asyncio.sleep(USERNAME_FILTER_REFRESH_SECONDS)
+        try:
+            if username_index.needs_resize():
+                await username_index.load()
+            else:
+                await username_index.refresh()
+        except Exception as e:
+            logger.error("Username filter refresh failed: %s", e)
+
+async def revocation_sync_loop():
+    """Pick up tokens revoked by other workers"""
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await revocation_index.sync(db)
+        except Exception as e:
+            logger.error("Revocation sync failed: %s", e)
+        await asyncio.sleep(REVOCATION_SYNC_SECONDS)
 
 # ============================================
-# SETUP LOGGING
+# STARTUP & SHUTDOWN
 # ============================================
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+# Importing this module has no side effects; everything below runs in the
+# lifespan, so workers and tests only pay for what is switched on.
+CREATE_TABLES = os.getenv("CREATE_TABLES", "0") == "1"
+STARTUP_PREWARM = os.getenv("STARTUP_PREWARM", "1") == "1"
+
+async def prewarm():
+    """Open a database connection, start the hash workers and load keys/indexes before traffic"""
+    for engine in async_engines:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    await asyncio.to_thread(hash_pool.warm)
+    get_keyring()
+    get_breached_index()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()  # Queue-based, see app/logging_config.py for LOG_* settings
+    log_legacy_hs256()
+    if CREATE_TABLES:
+        await asyncio.to_thread(create_tables)
+    else:
+        # Tables added by newer versions; a missing users table stops startup here
+        for table in await asyncio.to_thread(upgrade_tables):
+            logger.warning("Created missing table %s", table)
+    
+    background_tasks = []
+    if USER_COUNT_RECONCILE_SECONDS > 0:
+        background_tasks.append(asyncio.create_task(reconcile_user_count_loop()))
+    if USERNAME_FILTER_ENABLED:
+        background_tasks.append(asyncio.create_task(username_filter_loop()))
+    background_tasks.append(asyncio.create_task(revocation_sync_loop()))
+    if STARTUP_PREWARM:
+        await prewarm()
+        # Have the dummy hash for unknown-user logins ready before the first one
+        background_tasks.append(asyncio.create_task(dummy_hash_async()))
+    
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await close_signup_writers()
+        hash_pool.shutdown()
+        await dispose_engines()
+        stop_logging()
 
 app = FastAPI(
     title="Auth & User Management API - SQLite Edition",
     description="A complete authentication system with SQLite database",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -50,27 +169,77 @@ app.add_middleware(
 
 security = HTTPBearer()
 
+# Admin-only endpoints are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+# Per-request profiling (app/profiling.py); not installed at all unless enabled.
+# Added before log_requests below, so it runs inside it, in the endpoint's task.
+if PROFILE_ENABLED:
+    app.add_middleware(RequestProfilerMiddleware, admin_token=ADMIN_TOKEN)
+
+def require_admin(x_admin_token: str = Header(default="")):
+    """Dependency that only lets requests with the X-Admin-Token header through"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
 # ============================================
 # MIDDLEWARE FOR LOGGING ALL REQUESTS
 # ============================================
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
     """Log all incoming requests"""
-    logger.info(f"Request: {request.method} {request.url}")
-    
-    # Check for Authorization header
-    auth_header = request.headers.get("Authorization")
-    if auth_header:
-        logger.info(f"Auth header present: {auth_header[:30]}...")
-    
-    response = await call_next(request)
-    return response
+    # Lets LOG_ROUTE_LEVELS / LOG_SAMPLE_RATES apply to everything logged for this request
+    route_token = current_route.set(request.url.path)
+    try:
+        logger.info("Request: %s %s", request.method, request.url.path)
+        
+        # Check for Authorization header
+        auth_header = request.headers.get("Authorization")
+        if auth_header:
+            logger.debug("Auth header present: %.30s...", auth_header)
+        
+        started = time.perf_counter()
+        response = await call_next(request)
+        
+        # Label by route template (e.g. /users/count), never the raw path
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started, request.method, route, response.status_code
+        )
+        return response
+    finally:
+        current_route.reset(route_token)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    """Shed password hashing work with 503 once the hashing queue is full"""
+    logger.warning("Hashing queue full, rejecting %s %s", request.method, request.url.path)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy. Try again later."},
+        headers={"Retry-After": str(math.ceil(exc.retry_after))},
+    )
+
+async def token_priority():
+    """Dependency marking token-only requests, which go ahead of queued password hashing"""
+    with hash_admission.priority():
+        yield
 
 # ============================================
 # API ENDPOINTS
 # ============================================
+# Sessions on the user's shard (see USER_SHARDS in app/database.py)
+# Signup only looks the name up here, so it uses a reader connection
+# (released before hashing); the insert goes through the shard's writer
+# (see SQLITE_TUNED)
+async def get_signup_db(data: SignupRequest):
+    async with user_session(data.username, read_only=True) as db:
+        yield db
+
 @app.post("/signup")
-def signup(data: SignupRequest, db: Session = Depends(get_db)):
+async def signup(data: SignupRequest, db: AsyncSession = Depends(get_signup_db)):
     """
     Create a new user account in SQLite database
     
@@ -78,14 +247,15 @@ def signup(data: SignupRequest, db: Session = Depends(get_db)):
     - Username must be unique
     - Password must contain: uppercase, lowercase, number, and special character
     - Minimum 6 characters
+    - Not in the breached password list (if BREACHED_PASSWORDS_FILE is set)
     
     Example password: "Test123!"
     """
-    logger.info(f"Signup attempt for username: {data.username}")
+    logger.info("Signup attempt for username: %s", data.username)
     
     try:
-        create_user(db, data.username, data.password)
-        logger.info(f"User created successfully: {data.username}")
+        await create_user_async(db, data.username, data.password)
+        logger.info("User created successfully: %s", data.username)
         return {
             "message": "User created successfully",
             "username": data.username,
@@ -93,57 +263,150 @@ def signup(data: SignupRequest, db: Session = Depends(get_db)):
             "next_step": "Use /login to get a JWT token"
         }
     except UserAlreadyExists:
-        logger.warning(f"User already exists: {data.username}")
+        logger.warning("User already exists: %s", data.username)
         raise HTTPException(status_code=409, detail="User already exists")
+    except BreachedPassword:
+        logger.warning("Breached password for: %s", data.username)
+        raise HTTPException(
+            status_code=400,
+            detail="This password has appeared in a data breach. Please choose a different one"
+        )
     except WeakPassword:
-        logger.warning(f"Weak password for: {data.username}")
+        logger.warning("Weak password for: %s", data.username)
         raise HTTPException(
             status_code=400, 
             detail="Weak password. Must contain: uppercase, lowercase, number, special character (!.@#$%^&*()_[]), and be at least 6 characters"
         )
 
-@app.post("/login")
-def login(data: LoginRequest, db: Session = Depends(get_db)):
+async def login_rate_limit(request: Request, data: LoginRequest):
+    """
+    Dependency that rejects login floods with 429 before any DB or bcrypt work
+    
+    Limits apply per client IP and per username (see app/rate_limit.py).
+    """
+    if not LOGIN_RATE_LIMIT_ENABLED:
+        return
+    client_ip = request.client.host if request.client else "unknown"
+    retry_after = login_ip_limiter.acquire(client_ip) or login_user_limiter.acquire(data.username)
+    if retry_after:
+        logger.warning("Login rate limited for %s from %s", data.username, client_ip)
+        raise HTTPException(
+            status_code=429,
+            detail="Too many login attempts. Try again later.",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+@app.post("/login", dependencies=[Depends(login_rate_limit)])
+async def login(data: LoginRequest):
     """
     Authenticate and receive a JWT token
     
     Returns:
     - access_token: JWT token to use in Authorization header
+    - refresh_token: Exchange at /token/refresh for new tokens without the password
     - token_type: Always "bearer"
     
     How to use the token:
     Add to request headers: "Authorization: Bearer YOUR_TOKEN_HERE"
     """
-    logger.info(f"Login attempt for username: {data.username}")
+    logger.info("Login attempt for username: %s", data.username)
     
     try:
-        # Step 1: Verify credentials from database
-        authenticate_user(db, data.username, data.password)
-        logger.info(f"Credentials valid for: {data.username}")
+        # Step 1: Verify credentials from database (shared with identical attempts in flight)
+        await authenticate_login_async(data.username, data.password)
+        logger.info("Credentials valid for: %s", data.username)
         
-        # Step 2: Create JWT token
+        # Step 2: Create JWT tokens
         token = create_access_token({"sub": data.username})
+        refresh_token = create_refresh_token({"sub": data.username})
         
         # Log token info (safely)
-        token_preview = token[:50] + "..." if len(token) > 50 else token
-        logger.info(f"Token created for {data.username}: {token_preview}")
-        logger.info(f"Token will expire in 30 minutes")
+        logger.debug("Token created for %s: %.50s...", data.username, token)
         
         return {
             "access_token": token,
+            "refresh_token": refresh_token,
             "token_type": "bearer",
             "storage_backend": "SQLite database",
             "instructions": "Use this token in Authorization header: 'Bearer YOUR_TOKEN'"
         }
     except InvalidCredentials:
-        logger.warning(f"Invalid credentials for: {data.username}")
+        logger.warning("Invalid credentials for: %s", data.username)
         raise HTTPException(status_code=401, detail="Invalid username or password")
 
+@app.post("/token/refresh", dependencies=[Depends(token_priority)])
+async def refresh_tokens(data: RefreshRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Exchange a refresh token for a new access token and refresh token
+    
+    No password check: the refresh token proves a recent login. Each
+    refresh token works once; the used one is revoked.
+    """
+    try:
+        payload = decode_refresh_token(data.refresh_token)
+    except InvalidCredentials as e:
+        logger.warning("Refresh rejected: %s", e)
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    
+    if not await revoke_token(db, payload):
+        logger.warning("Refresh token reused for: %s", payload.get("sub"))
+        raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
+    
+    username = payload["sub"]
+    return {
+        "access_token": create_access_token({"sub": username}),
+        "refresh_token": create_refresh_token({"sub": username}),
+        "token_type": "bearer",
+    }
+
+@app.post("/token/revoke", dependencies=[Depends(token_priority)])
+async def revoke(data: RevokeRequest, db: AsyncSession = Depends(get_db)):
+    """Revoke an access or refresh token before it expires (e.g. on logout)"""
+    try:
+        payload = decode_any_token(data.token)
+    except InvalidCredentials:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    if "jti" not in payload:
+        raise HTTPException(status_code=400, detail="Token predates revocation support; it expires on its own")
+    
+    await revoke_token(db, payload)
+    return {"revoked": True}
+
+# ============================================
+# SIGNING KEYS
+# ============================================
+JWKS_MAX_AGE_SECONDS = int(os.getenv("JWKS_MAX_AGE_SECONDS", "300"))
+
+@app.get("/.well-known/jwks.json")
+def jwks(if_none_match: str = Header(default="")):
+    """
+    Public keys for verifying our tokens locally (empty with HS256)
+    
+    Services pick the key by the token's `kid` header and refetch this
+    document when they see a kid they don't know yet.
+    """
+    keyring = get_keyring()
+    body, etag = keyring.jwks() if keyring is not None else ('{"keys": []}', '"empty"')
+    headers = {"Cache-Control": f"public, max-age={JWKS_MAX_AGE_SECONDS}", "ETag": etag}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+@app.post("/keys/rotate", dependencies=[Depends(require_admin)])
+def rotate_signing_key():
+    """Start signing with a new key; old keys keep verifying until pruned (admin only)"""
+    keyring = get_keyring()
+    if keyring is None:
+        raise HTTPException(status_code=400, detail="Key rotation needs JWT_ALGORITHM=EdDSA or RS256")
+    key = keyring.rotate()
+    return {"kid": key.kid, "algorithm": key.algorithm, "keys": len(keyring.keys)}
+
 # ============================================
 # TOKEN VERIFICATION & PROTECTED ROUTES
 # ============================================
 def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security)
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    _priority: None = Depends(token_priority),
 ):
     """
     Dependency function to extract and verify JWT token
@@ -164,18 +427,34 @@ def get_current_user(
         token = token[7:]  # Remove "Bearer "
         logger.warning("User included 'Bearer' in token, removing it...")
     
-    logger.info(f"Token verification requested")
-    logger.info(f"Token received: {token[:30]}...")
+    logger.debug("Token verification requested")
+    logger.debug("Token received: %.30s...", token)
     
     try:
         payload = decode_access_token(token)
         username = payload["sub"]
-        logger.info(f"Token valid! User authenticated: {username}")
+        logger.debug("Token valid! User authenticated: %s", username)
         return username
     except Exception as e:
-        logger.error(f"Token verification FAILED: {str(e)}")
+        logger.warning("Token verification FAILED: %s", e)
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
+VERIFY_BATCH_MAX_TOKENS = int(os.getenv("VERIFY_BATCH_MAX_TOKENS", "10000"))
+
+@app.post("/tokens/verify-batch", dependencies=[Depends(token_priority)])
+def verify_token_batch(data: VerifyBatchRequest):
+    """
+    Verify many access tokens in one call (for API gateways)
+    
+    Same checks as protected routes. Results come back in request order:
+    {"valid": true, "sub", "exp"} or {"valid": false, "error", "detail"},
+    where error is InvalidToken, TokenExpired or TokenRevoked.
+    """
+    if len(data.tokens) > VERIFY_BATCH_MAX_TOKENS:
+        raise HTTPException(status_code=413, detail=f"At most {VERIFY_BATCH_MAX_TOKENS} tokens per batch")
+    results = verify_access_tokens(data.tokens)
+    return {"valid": sum(r["valid"] for r in results), "results": results}
+
 @app.get("/protected")
 def protected_route(current_user: str = Depends(get_current_user)):
     """
@@ -195,20 +474,65 @@ def protected_route(current_user: str = Depends(get_current_user)):
 # DATABASE INFO ENDPOINT
 # ============================================
 @app.get("/database-info")
-def database_info(db: Session = Depends(get_db)):
+async def database_info():
     """Show database statistics"""
-    from app.database import User
-    total_users = db.query(User).count()
+    total_users = await count_all_users_async()
     
     return {
         "database": "SQLite",
         "database_file": "users.db",
+        "user_shards": shard_files if USER_SHARDS > 1 else None,
         "total_users": total_users,
         "table": "users",
         "columns": ["id", "username", "password_hash"],
+        "sqlite": sqlite_settings(),
+        "signup_group_commit": [w.stats() for w in signup_writers] if SIGNUP_GROUP_COMMIT else None,
         "status": "connected"
     }
 
+@app.get("/hash-pool-info")
+def hash_pool_info():
+    """Show password hashing pool usage and admission control"""
+    return {**hash_pool.stats(), "admission": hash_admission.stats()}
+
+@app.get("/profiles", dependencies=[Depends(require_admin)])
+def profiles():
+    """Saved request profiles, newest first (see PROFILE_ENABLED)"""
+    return {"enabled": PROFILE_ENABLED, "profiles": list_profiles()}
+
+@app.get("/profiles/{name}", response_class=PlainTextResponse, dependencies=[Depends(require_admin)])
+def profile(name: str):
+    """
+    One request profile as folded stacks
+    
+    Render with `flamegraph.pl profile.folded > profile.svg` or open it
+    in https://www.speedscope.app
+    """
+    folded = read_profile(name)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="No such profile")
+    return folded
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus metrics: request, bcrypt, DB and JWT latencies plus pool/cache gauges"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/username-filter-info")
+def username_filter_info():
+    """Show username filter size, false-positive rate and memory use"""
+    return username_index.stats()
+
+@app.get("/token-cache-info")
+def token_cache_info():
+    """Show verified-token cache statistics"""
+    return token_cache.stats()
+
+@app.get("/user-cache-info")
+def user_cache_info():
+    """Show login user-record cache statistics"""
+    return user_cache.stats()
+
 # ============================================
 # DEBUG & LEARNING ENDPOINTS
 # ============================================
@@ -224,7 +548,18 @@ def root():
             "signup": "/signup (POST)",
             "login": "/login (POST)",
             "protected": "/protected (GET - requires auth)",
+            "refresh": "/token/refresh (POST)",
+            "revoke": "/token/revoke (POST)",
+            "jwks": "/.well-known/jwks.json (GET)",
+            "verify_batch": "/tokens/verify-batch (POST)",
             "database_info": "/database-info (GET)",
+            "hash_pool_info": "/hash-pool-info (GET)",
+            "token_cache_info": "/token-cache-info (GET)",
+            "user_cache_info": "/user-cache-info (GET)",
+            "users": "/users (GET - admin, paginated)",
+            "profiles": "/profiles (GET - admin)",
+            "username_filter_info": "/username-filter-info (GET)",
+            "metrics": "/metrics (GET - Prometheus format)",
             "verify": "/verify-config (GET)",
             "test": "/test-jwt-direct (GET)"
         }
@@ -233,11 +568,14 @@ def root():
 @app.get("/verify-config")
 def verify_jwt_config():
     """Verify JWT configuration is consistent"""
+    keyring = get_keyring()
     return {
         "jwt_configuration": {
             "secret_key_length": len(SECRET_KEY),
             "secret_key_preview": SECRET_KEY[:15] + "...",
             "algorithm": ALGORITHM,
+            "signing_algorithm": JWT_ALGORITHM,
+            "active_kid": keyring.active.kid if keyring is not None else None,
             "token_expiry_minutes": 30
         },
         "database": {
@@ -254,7 +592,7 @@ def debug_token_test(token: str):
     Paste your token here to see if it decodes correctly
     Useful for troubleshooting
     """
-    logger.info(f"Debug token test received token: {token[:50]}...")
+    logger.info("Debug token test received token: %.50s...", token)
     
     try:
         payload = decode_access_token(token)
@@ -321,10 +659,9 @@ def test_jwt_direct_creation():
 # USER MANAGEMENT ENDPOINTS (For learning)
 # ============================================
 @app.get("/users/count")
-def count_users(db: Session = Depends(get_db)):
+async def count_users():
     """Count how many users are registered in database"""
-    from app.database import User
-    total_users = db.query(User).count()
+    total_users = await count_all_users_async()
     
     return {
         "total_users": total_users,
@@ -332,6 +669,83 @@ def count_users(db: Session = Depends(get_db)):
         "table": "users"
     }
 
+@app.get("/users", dependencies=[Depends(require_admin)])
+async def list_users(
+    after: Optional[str] = None,
+    prefix: Optional[str] = None,
+    limit: int = Query(USER_PAGE_SIZE, ge=1, le=USER_PAGE_MAX),
+    format: str = "json",
+):
+    """
+    Browse users ordered by username (admin only)
+    
+    Pass the returned `next` value as `after` to get the following page;
+    every page is an index seek, however deep. `prefix` limits the list to
+    usernames starting with it. format=ndjson streams every match instead.
+    """
+    if format == "ndjson":
+        async def lines():
+            # Own sessions: the response outlives the request's dependencies
+            async with async_shard_sessions(read_only=True) as dbs:
+                async for chunk in iter_users_ndjson(dbs, prefix):
+                    yield chunk
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+    
+    async with async_shard_sessions(read_only=True) as dbs:
+        rows, next_after = await list_users_page(dbs, after, prefix, limit)
+    return {
+        "users": [{"id": user_id, "username": username} for username, user_id in rows],
+        "next": next_after,
+    }
+
+@app.post("/users/count/reconcile", dependencies=[Depends(require_admin)])
+async def reconcile_user_count():
+    """Recount the users table and fix the maintained counter (admin only)"""
+    return await reconcile_all_user_counts_async()
+
+@app.post("/users/import", dependencies=[Depends(require_admin)])
+async def import_users(request: Request, format: str = "ndjson"):
+    """
+    Bulk import users from an NDJSON or CSV request body (admin only)
+    
+    The body is read as a stream and inserted in batched transactions.
+    Each row needs "username" plus "password" or "password_hash".
+    Rejected rows are reported with their line number and error type
+    (UserAlreadyExists, WeakPassword, BreachedPassword or InvalidRow, which
+    includes lines over BULK_MAX_LINE_BYTES). Only the first
+    BULK_MAX_REPORTED_ERRORS are listed; "rejected" counts them all.
+    """
+    if format not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {BULK_FORMATS}")
+    
+    created, rejected, errors = 0, 0, []
+    async with async_shard_sessions() as dbs:
+        async for result in import_users_async(dbs, aiter_lines(request.stream()), format):
+            created += result["created"]
+            rejected += len(result["errors"])
+            errors.extend(result["errors"][:BULK_MAX_REPORTED_ERRORS - len(errors)])
+    
+    logger.info("Bulk import finished: %d created, %d rejected", created, rejected)
+    return {"created": created, "rejected": rejected, "errors": errors,
+            "errors_truncated": rejected > len(errors)}
+
+@app.get("/users/export", dependencies=[Depends(require_admin)])
+async def export_users(format: str = "ndjson"):
+    """Stream every user as NDJSON or CSV without loading the table (admin only)"""
+    if format not in BULK_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {BULK_FORMATS}")
+    
+    async def rows():
+        # Own sessions: the response outlives the request's dependencies
+        async with async_shard_sessions(read_only=True) as dbs:
+            async for line in export_users_async(dbs, format):
+                yield line
+    
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    return StreamingResponse(rows(), media_type=media_type)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,51 @@
+# manage_keys.py
+"""
+Manage the JWT signing keys in JWT_KEYS_DIR
+
+Examples:
+    python manage_keys.py list
+    python manage_keys.py rotate --algorithm EdDSA
+    python manage_keys.py prune --max-age-days 8
+
+Running workers pick up a rotated key when they first see its kid
+(or restart them to switch the signing key straight away). Only prune
+keys older than the longest token lifetime, or tokens they signed stop
+verifying.
+"""
+import argparse
+from datetime import datetime
+
+from app.auth_service import REFRESH_TOKEN_EXPIRE_DAYS
+from app.keys import ASYMMETRIC_ALGORITHMS, JWT_ALGORITHM, JWT_KEYS_DIR, KeyRing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List, rotate and prune JWT signing keys")
+    parser.add_argument("command", choices=["list", "rotate", "prune"])
+    parser.add_argument("--algorithm", choices=ASYMMETRIC_ALGORITHMS,
+                        default=JWT_ALGORITHM if JWT_ALGORITHM in ASYMMETRIC_ALGORITHMS else "EdDSA",
+                        help="algorithm for new keys")
+    parser.add_argument("--keys-dir", default=JWT_KEYS_DIR)
+    parser.add_argument("--max-age-days", type=float, default=REFRESH_TOKEN_EXPIRE_DAYS + 1,
+                        help="prune: delete inactive keys older than this")
+    args = parser.parse_args()
+
+    keyring = KeyRing(args.keys_dir, args.algorithm)
+    keyring.load(create_missing=False)
+
+    if args.command == "rotate":
+        key = keyring.rotate()
+        print(f"✅ New {key.algorithm} signing key: {key.kid}")
+    elif args.command == "prune":
+        removed = keyring.prune(args.max_age_days * 86400)
+        print(f"✅ Removed {len(removed)} key(s): {', '.join(removed) or '-'}")
+
+    print(f"Keys in {args.keys_dir}:")
+    for key in sorted(keyring.keys.values(), key=lambda k: k.created, reverse=True):
+        marker = "*" if key is keyring.active else " "
+        created = datetime.fromtimestamp(key.created).isoformat(timespec="seconds")
+        print(f" {marker} {key.kid}  {key.algorithm}  created {created}")
+
+
+if __name__ == "__main__":
+    main()